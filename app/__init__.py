@@ -1,6 +1,7 @@
 from flask import Flask
 from app.config import load_configurations, configure_logging
-from app.routes.webhook_routes import webhook_blueprint
+from app.routes.webhook_routes import webhook_blueprint, register_webhook_handlers
+from app.services.webhook_queue import init_webhook_queue
 from app.routes.auth_routes import auth_blueprint
 from app.routes.profile_routes import profile_blueprint
 from app.routes.app_routes import app_blueprint
@@ -15,6 +16,8 @@ from app.routes.contact_routes import contact_routes
 from app.routes.dashboard_routes import admin_dashboard
 from app.routes.admin_user_routes import admin_user_blueprint
 from app.routes.super_admin_routes import super_admin_blueprint
+from app.utils.client_registry import client_registry
+import logging
 import sys
 import os
 
@@ -50,4 +53,14 @@ def create_app():
     app.register_blueprint(admin_dashboard)
     app.register_blueprint(admin_user_blueprint)
     app.register_blueprint(super_admin_blueprint)
+
+    # Background webhook processing (only when WEBHOOK_QUEUE_ENABLED=true)
+    webhook_queue = init_webhook_queue(app)
+    if webhook_queue:
+        register_webhook_handlers(webhook_queue)
+
+    # Importing the app must not build network clients: they would be shared by forked workers under --preload
+    created = [name for name, info in client_registry.stats()["clients"].items() if info["initialized"]]
+    if created:
+        logging.warning(f"[ClientRegistry] Clients created while importing the app: {created}")
     return app
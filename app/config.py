@@ -16,6 +16,11 @@ def load_configurations(app):
     app.config["VERIFY_TOKEN"] = os.getenv("VERIFY_TOKEN")
     app.config["TELEGRAM_BOT_TOKEN"] = os.getenv("TELEGRAM_BOT_TOKEN")
 
+    # Ack-first webhook ingestion: persist the payload, reply 200, process in the background
+    app.config["WEBHOOK_QUEUE_ENABLED"] = os.getenv("WEBHOOK_QUEUE_ENABLED", "false").lower() == "true"
+    app.config["WEBHOOK_QUEUE_PATH"] = os.getenv("WEBHOOK_QUEUE_PATH", "webhook_queue.db")
+    app.config["WEBHOOK_QUEUE_WORKERS"] = int(os.getenv("WEBHOOK_QUEUE_WORKERS", "4"))
+
 def configure_logging():
     logging.basicConfig(
         level=logging.INFO,
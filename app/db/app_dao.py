@@ -1,12 +1,44 @@
 from datetime import datetime, timezone
+import os
 import uuid
 import secrets
 from app.db.firestore_helper import get_collection
 from app.db.metrics_dao import increment_daily, decrement_daily, increment_metric, decrement_metric
+from app.utils.ttl_cache import TTLCache
 from google.cloud.firestore_v1 import FieldFilter, Query
 
 apps_ref = get_collection("apps")
 
+# Webhook-path lookups (phone_number_id / app_token -> app) are cached per process.
+# update_app/delete_app invalidate explicitly; other workers converge within APP_CACHE_TTL.
+APP_CACHE_TTL = int(os.getenv("APP_CACHE_TTL", "300"))
+APP_CACHE_MAX_SIZE = int(os.getenv("APP_CACHE_MAX_SIZE", "10000"))
+APP_CACHE_NEGATIVE_TTL = 30  # unknown numbers/tokens are re-checked quickly
+_NOT_FOUND = {}
+
+apps_by_phone_cache = TTLCache("apps_by_phone_number_id", maxsize=APP_CACHE_MAX_SIZE, ttl=APP_CACHE_TTL)
+apps_by_token_cache = TTLCache("apps_by_app_token", maxsize=APP_CACHE_MAX_SIZE, ttl=APP_CACHE_TTL)
+
+# Reply mode decides whether the bot answers at all (e.g. after a human takes over), so it is
+# re-read with a short TTL instead of trusting the webhook snapshot; other workers see a
+# change within REPLY_MODE_CACHE_TTL seconds (0 reads it on every message).
+REPLY_MODE_CACHE_TTL = int(os.getenv("REPLY_MODE_CACHE_TTL", "5"))
+REPLY_MODE_FIELDS = ["ai_reply_mode", "scheduled_schedule"]
+reply_mode_cache = TTLCache("app_reply_modes", maxsize=APP_CACHE_MAX_SIZE, ttl=REPLY_MODE_CACHE_TTL)
+
+
+def invalidate_app_cache(app_data):
+    """Drop cached lookups that resolve to this app (by phone_number_id and app_token)."""
+    if not app_data:
+        return
+    phone_number_id = (app_data.get("waba_settings") or {}).get("phone_number_id")
+    if phone_number_id:
+        apps_by_phone_cache.delete(phone_number_id)
+    if app_data.get("app_token"):
+        apps_by_token_cache.delete(app_data["app_token"])
+    if app_data.get("app_id"):
+        reply_mode_cache.delete(app_data["app_id"])
+
 def is_valid_settings(settings: dict):
     """Helper to validate settings safely."""
     if not isinstance(settings, dict):
@@ -75,6 +107,7 @@ def create_app(owner_id, owner_name, name, settings=None):
         app_data["telegram_settings"] = telegram
         
     apps_ref.document(app_id).set(app_data)
+    invalidate_app_cache(app_data)
     increment_metric("total_apps")
     increment_daily("apps_created")
     return app_data
@@ -84,6 +117,16 @@ def get_app_by_id(app_id):
     doc = apps_ref.document(app_id).get()
     return doc.to_dict() if doc.exists else None
 
+# Get an app's reply-mode fields (see REPLY_MODE_CACHE_TTL)
+def get_app_reply_settings(app_id):
+    settings = reply_mode_cache.get(app_id)
+    if settings is None:
+        doc = apps_ref.document(app_id).get(field_paths=REPLY_MODE_FIELDS)
+        settings = (doc.to_dict() or {}) if doc.exists else {}
+        if REPLY_MODE_CACHE_TTL > 0:
+            reply_mode_cache.set(app_id, settings)
+    return settings
+
 # Get app by user ID (owner_id)
 def get_app_by_user_id(user_id, limit=20, start_after_created_at=None, sort_order="asc", platform=None):
     direction = Query.ASCENDING if sort_order == "asc" else Query.DESCENDING
@@ -103,19 +146,41 @@ def get_app_by_user_id(user_id, limit=20, start_after_created_at=None, sort_orde
     query = query.limit(limit).stream()
     return [doc.to_dict() for doc in query]
 
-# Get app by app token
+# Get app by app token (cached)
 def get_app_by_app_token(app_token):
+    cached = apps_by_token_cache.get(app_token)
+    if cached is not None:
+        return cached or None
+
+    app = None
     query = apps_ref.where(filter=FieldFilter("app_token", "==", app_token)).limit(1).stream()
     for doc in query:
-        return doc.to_dict()
-    return None
+        app = doc.to_dict()
+        break
+
+    if app:
+        apps_by_token_cache.set(app_token, app)
+    else:
+        apps_by_token_cache.set(app_token, _NOT_FOUND, ttl=APP_CACHE_NEGATIVE_TTL)
+    return app
 
-# Get app by WABA phone number ID
+# Get app by WABA phone number ID (cached)
 def get_app_by_waba_phone_id(phone_number_id):
+    cached = apps_by_phone_cache.get(phone_number_id)
+    if cached is not None:
+        return cached or None
+
+    app = None
     query = apps_ref.where(filter=FieldFilter("waba_settings.phone_number_id", "==", phone_number_id)).limit(1).stream()
     for doc in query:
-        return doc.to_dict()
-    return None
+        app = doc.to_dict()
+        break
+
+    if app:
+        apps_by_phone_cache.set(phone_number_id, app)
+    else:
+        apps_by_phone_cache.set(phone_number_id, _NOT_FOUND, ttl=APP_CACHE_NEGATIVE_TTL)
+    return app
 
 # Update app fields
 def update_app(app_id, updates: dict):
@@ -153,6 +218,12 @@ def update_app(app_id, updates: dict):
             decrement_daily("new_telegram_bots")
             
     apps_ref.document(app_id).update(updates)
+    invalidate_app_cache(existing_data)
+    reply_mode_cache.delete(app_id)
+    # A newly assigned number may have been cached as "not found"
+    new_waba = updates.get("waba_settings")
+    if isinstance(new_waba, dict) and new_waba.get("phone_number_id"):
+        apps_by_phone_cache.delete(new_waba["phone_number_id"])
 
 # List all apps owned by a user
 def list_user_apps(owner_id, limit=20, start_after_created_at=None, sort_order="asc", platform=None):
@@ -189,6 +260,7 @@ def delete_app(app_id):
             decrement_metric("total_telegram_bots")
             decrement_daily("new_telegram_bots")
         decrement_metric("total_apps")
+        invalidate_app_cache(data)
     apps_ref.document(app_id).delete()
 
 
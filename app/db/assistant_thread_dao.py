@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+from google.cloud import firestore
+from app.db.firestore_helper import get_collection
+
+assistant_threads_ref = get_collection("assistant_threads")
+MAX_BATCH_WRITE = 500
+
+# Mapping of (app_id, chat_id) -> OpenAI thread id. Kept apart from "threads",
+# which holds the dashboard's last-message view of a chat.
+def _doc_id(app_id, chat_id):
+    return f"{app_id}:{chat_id}"
+
+def get_assistant_thread(app_id, chat_id):
+    doc = assistant_threads_ref.document(_doc_id(app_id, chat_id)).get()
+    return doc.to_dict() if doc.exists else None
+
+# Store the mapping only if the chat has none yet. Returns the thread id that won,
+# which is an existing one when another worker created it first.
+def create_assistant_thread(app_id, chat_id, thread_id):
+    doc_ref = assistant_threads_ref.document(_doc_id(app_id, chat_id))
+    now = datetime.now(timezone.utc)
+    try:
+        doc_ref.create({
+            "app_id": app_id,
+            "chat_id": chat_id,
+            "thread_id": thread_id,
+            "generation": 0,
+            "turns": 0,
+            "created_at": now,
+            "last_active_at": now
+        })
+        return thread_id
+    except AlreadyExists:
+        return doc_ref.get().to_dict().get("thread_id")
+
+# Overwrite the mapping (e.g. when importing legacy mappings)
+def set_assistant_thread(app_id, chat_id, thread_id):
+    assistant_threads_ref.document(_doc_id(app_id, chat_id)).set({
+        "app_id": app_id,
+        "chat_id": chat_id,
+        "thread_id": thread_id,
+        "updated_at": datetime.now(timezone.utc)
+    }, merge=True)
+
+# Add turns counted in memory to the chats' current threads, in batched writes.
+# `turns` maps (app_id, chat_id) -> {"turns", "last_prompt_tokens", "last_active"}.
+def record_assistant_thread_turns(turns):
+    writes = []
+    for (app_id, chat_id), counts in turns.items():
+        writes.append((assistant_threads_ref.document(_doc_id(app_id, chat_id)), {
+            "turns": firestore.Increment(counts["turns"]),
+            "last_prompt_tokens": counts["last_prompt_tokens"],
+            "last_active_at": datetime.fromtimestamp(counts["last_active"], timezone.utc)
+        }))
+
+    client = assistant_threads_ref._client
+    for i in range(0, len(writes), MAX_BATCH_WRITE):
+        batch = client.batch()
+        for doc_ref, data in writes[i:i + MAX_BATCH_WRITE]:
+            batch.set(doc_ref, data, merge=True)
+        batch.commit()
+    return len(writes)
+
+# Move the chat to a new thread generation, unless another worker already moved it
+# away from `previous_thread_id`. Returns the thread id the chat ends up on.
+def rotate_assistant_thread(app_id, chat_id, thread_id, previous_thread_id):
+    doc_ref = assistant_threads_ref.document(_doc_id(app_id, chat_id))
+    snapshot = doc_ref.get()
+    if snapshot.exists and snapshot.get("thread_id") != previous_thread_id:
+        return snapshot.get("thread_id")
+
+    now = datetime.now(timezone.utc)
+    data = {
+        "app_id": app_id,
+        "chat_id": chat_id,
+        "thread_id": thread_id,
+        "previous_thread_id": previous_thread_id,
+        "generation": firestore.Increment(1),
+        "turns": 0,
+        "last_prompt_tokens": 0,
+        "rotated_at": now,
+        "last_active_at": now
+    }
+    try:
+        if snapshot.exists:
+            doc_ref.update(data, option=assistant_threads_ref._client.write_option(last_update_time=snapshot.update_time))
+        else:
+            doc_ref.set(data)
+        return thread_id
+    except FailedPrecondition:
+        return doc_ref.get().to_dict().get("thread_id")
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from google.cloud.firestore_v1 import FieldFilter
-from app.db.firestore_helper import get_collection
+from app.db.firestore_helper import get_collection, get_firestore_client
 
 contacts_ref = get_collection("contacts")
 
@@ -24,8 +24,7 @@ def save_contact(user_id, platform, chat_id, name, phone_number=None, telegram_u
     return contact_data
 
 def save_contacts_batch(user_id, platform, contacts):
-    from google.cloud import firestore
-    client = firestore.Client()
+    client = get_firestore_client()
     now = datetime.now(timezone.utc)
     batches = [contacts[i:i + MAX_BATCH_WRITE] for i in range(0, len(contacts), MAX_BATCH_WRITE)]
 
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from google.cloud import firestore
+from google.cloud.firestore_v1 import FieldFilter
+from app.db.firestore_helper import get_collection
+
+message_status_ref = get_collection("message_statuses")
+delivery_stats_ref = get_collection("delivery_stats")
+
+MAX_BATCH_WRITE = 500
+
+# Later statuses win; a late "delivered" never downgrades a "read"
+STATUS_RANK = {"sent": 1, "delivered": 2, "read": 3, "failed": 4}
+
+def _current_status(timestamps):
+    return max(timestamps, key=lambda status: STATUS_RANK.get(status, 0)) if timestamps else None
+
+# Write coalesced delivery states and per-app daily counters in batched writes.
+#   states:   {wamid: {"status": ..., "app_id": ..., "recipient_id": ..., "timestamps": {status: ts}, ...}}
+#   counters: {(app_id, "YYYY-MM-DD"): {status: count}}
+# Only the timestamps.<status> fields are merged into a message document, never "status" itself:
+# a status flushed after a higher one (delivered after read) must not overwrite it.
+def save_delivery_updates(states: dict, counters: dict):
+    now = datetime.now(timezone.utc)
+    writes = []
+
+    for message_id, state in states.items():
+        data = {key: value for key, value in state.items() if key != "status"}
+        data.update({"message_id": message_id, "updated_at": now})
+        writes.append((message_status_ref.document(message_id), data))
+
+    for (app_id, date), counts in counters.items():
+        data = {status: firestore.Increment(n) for status, n in counts.items()}
+        data.update({"app_id": app_id, "date": date, "updated_at": now})
+        writes.append((delivery_stats_ref.document(f"{app_id}_{date}"), data))
+
+    client = message_status_ref._client
+    for i in range(0, len(writes), MAX_BATCH_WRITE):
+        batch = client.batch()
+        for doc_ref, data in writes[i:i + MAX_BATCH_WRITE]:
+            batch.set(doc_ref, data, merge=True)
+        batch.commit()
+    return len(writes)
+
+# Get the delivery state of a single outbound message
+def get_message_status(message_id):
+    doc = message_status_ref.document(message_id).get()
+    if not doc.exists:
+        return None
+    data = doc.to_dict()
+    # Derived from the merged timestamps so every status ever received is taken into account
+    data["status"] = _current_status(data.get("timestamps")) or data.get("status")
+    return data
+
+# Get daily delivery counters for an app, newest first
+def get_delivery_stats_by_app(app_id, limit=30):
+    query = delivery_stats_ref.where(filter=FieldFilter("app_id", "==", app_id)).order_by("date", direction=firestore.Query.DESCENDING).limit(limit)
+    return [doc.to_dict() for doc in query.stream()]
@@ -1,20 +1,47 @@
 import os
 from google.cloud import firestore
 from google.oauth2 import service_account
+from app.utils.client_registry import client_registry, ClientNotConfigured
 
-# Reuse Firestore client and project config
-db_host = os.getenv("FIRESTORE_EMULATOR_HOST")
-project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
-credentials = service_account.Credentials.from_service_account_file("secrets/firebase-key.json")
+FIREBASE_KEY_PATH = os.getenv("FIREBASE_KEY_PATH", "secrets/firebase-key.json")
+
+
+def _create_client():
+    project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        return firestore.Client(project=project_id)
+    if not os.path.exists(FIREBASE_KEY_PATH):
+        raise ClientNotConfigured(f"Firestore key file {FIREBASE_KEY_PATH} not found")
+    credentials = service_account.Credentials.from_service_account_file(FIREBASE_KEY_PATH)
+    return firestore.Client(credentials=credentials, project=project_id, database="chatagent")
+
+
+client_registry.register(
+    "firestore", _create_client,
+    probe=lambda client: client.collection("_health").document("probe").get(timeout=10)
+)
+
+
+class LazyCollection:
+    """
+    Collection reference that DAO modules can create at import: it resolves
+    against the current process's Firestore client each time it is used.
+    """
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_firestore_client().collection(self.name), attr)
 
-if db_host:
-    os.environ["FIRESTORE_EMULATOR_HOST"] = db_host
-    _client = firestore.Client(project=project_id)
-else:
-    _client = firestore.Client(credentials=credentials, project=project_id, database="chatagent")
 
 def get_firestore_client():
-    return _client
+    return client_registry.get("firestore")
+
+def get_batch():
+    return get_firestore_client().batch()
 
 def get_collection(name):
-    return _client.collection(name)
+    return LazyCollection(name)
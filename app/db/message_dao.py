@@ -5,8 +5,9 @@ from app.db.thread_dao import upsert_thread_last_message, get_threads_by_app_id
 
 messages_ref = get_collection("messages")
 
-# Save a user, assistant, or human agent message to Firestore
-def save_message(**kwargs):
+# Save a user, assistant, or human agent message to Firestore.
+# Pass batch=<WriteBatch> to queue the writes instead of sending them immediately.
+def save_message(batch=None, **kwargs):
     now = datetime.now(timezone.utc)
 
     message_data = {
@@ -28,7 +29,10 @@ def save_message(**kwargs):
 
     doc_ref = messages_ref.document()
     message_data["message_id"] = doc_ref.id
-    doc_ref.set(message_data)
+    if batch is not None:
+        batch.set(doc_ref, message_data)
+    else:
+        doc_ref.set(message_data)
     
     
     # Update latest thread info
@@ -39,7 +43,8 @@ def save_message(**kwargs):
         platform=message_data["platform"],
         role=message_data["role"],
         message_type=message_data["message_type"],
-        file_url=message_data["file_url"]
+        file_url=message_data["file_url"],
+        batch=batch
     )
     return message_data
 
@@ -3,13 +3,17 @@ from google.cloud import firestore
 from app.db.firestore_helper import get_collection
 from google.cloud.firestore_v1 import FieldFilter
 
-metrics_ref = get_collection("metrics").document("summary")
+metrics_collection_ref = get_collection("metrics")
 daily_ref = get_collection("daily_stats")
 users_ref = get_collection("users")
 apps_ref = get_collection("apps")
 
+# Resolved per call so importing this module does not create the Firestore client
+def _metrics_ref():
+    return metrics_collection_ref.document("summary")
+
 def increment_metric(field_name: str):
-    metrics_ref.set({field_name: firestore.Increment(1), "last_updated": datetime.now(timezone.utc)}, merge=True)
+    _metrics_ref().set({field_name: firestore.Increment(1), "last_updated": datetime.now(timezone.utc)}, merge=True)
 
 def increment_daily(field_name: str):
     today = datetime.utcnow().strftime("%Y-%m-%d")
@@ -17,7 +21,7 @@ def increment_daily(field_name: str):
     ref.set({field_name: firestore.Increment(1), "date": today}, merge=True)
     
 def decrement_metric(field_name: str):
-    metrics_ref.set({field_name: firestore.Increment(-1), "last_updated": datetime.now(timezone.utc)}, merge=True)
+    _metrics_ref().set({field_name: firestore.Increment(-1), "last_updated": datetime.now(timezone.utc)}, merge=True)
     
 def decrement_daily(field_name: str):
     today = datetime.utcnow().strftime("%Y-%m-%d")
@@ -25,7 +29,7 @@ def decrement_daily(field_name: str):
     ref.set({field_name: firestore.Increment(-11), "date": today}, merge=True)
 
 def get_summary_metrics():
-    doc = metrics_ref.get()
+    doc = _metrics_ref().get()
     return doc.to_dict() if doc.exists else {}
 
 def get_daily_metrics(date_str: str):
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone, timedelta
+from google.api_core.exceptions import AlreadyExists
+from app.db.firestore_helper import get_collection
+
+processed_events_ref = get_collection("processed_events")
+
+# Atomically record a webhook event id. Returns False if another worker already recorded it.
+# `expires_at` can be used as a Firestore TTL policy field to purge old ids.
+def mark_event_processed(event_key, ttl_seconds):
+    now = datetime.now(timezone.utc)
+    try:
+        processed_events_ref.document(event_key).create({
+            "event_key": event_key,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=ttl_seconds)
+        })
+        return True
+    except AlreadyExists:
+        return False
+
+# Drop a claim whose event could not be processed, so a redelivery or retry is handled again
+def release_event(event_key):
+    processed_events_ref.document(event_key).delete()
@@ -4,7 +4,7 @@ from google.cloud.firestore_v1 import FieldFilter
 
 subscriptions_ref = get_collection("subscriptions")
 
-def create_subscription(tier, price, level, duration_days):
+def create_subscription(tier, price, level, duration_days, latency_budget=None):
     now = datetime.now(timezone.utc)
 
     # Check for existing tier
@@ -17,6 +17,7 @@ def create_subscription(tier, price, level, duration_days):
         "price": price,
         "level": level,
         "duration_days": duration_days,
+        "latency_budget": latency_budget,
         "created_at": now,
         "updated_at": now
     }
@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+from app.db.firestore_helper import get_collection
+
+offsets_ref = get_collection("telegram_offsets")
+
+# Last confirmed getUpdates offset for an app's bot (long-polling mode)
+def get_telegram_offset(app_id):
+    doc = offsets_ref.document(app_id).get()
+    return doc.to_dict().get("offset") if doc.exists else None
+
+def set_telegram_offset(app_id, offset):
+    offsets_ref.document(app_id).set({
+        "app_id": app_id,
+        "offset": offset,
+        "updated_at": datetime.now(timezone.utc)
+    }, merge=True)
@@ -5,9 +5,9 @@ from google.cloud.firestore_v1 import FieldFilter
 threads_ref = get_collection("threads")
 
 # Save or update the last message of a thread (chat_id)
-def upsert_thread_last_message(chat_id, app_id, content, platform, role="user", message_type="text", file_url=None):
+def upsert_thread_last_message(chat_id, app_id, content, platform, role="user", message_type="text", file_url=None, batch=None):
     now = datetime.now(timezone.utc)
-    threads_ref.document(chat_id).set({
+    data = {
         "chat_id": chat_id,
         "app_id": app_id,
         "last_message": content,
@@ -16,7 +16,12 @@ def upsert_thread_last_message(chat_id, app_id, content, platform, role="user",
         "role": role,
         "message_type": message_type,
         "file_url": file_url
-    }, merge=True)
+    }
+    doc_ref = threads_ref.document(chat_id)
+    if batch is not None:
+        batch.set(doc_ref, data, merge=True)
+    else:
+        doc_ref.set(data, merge=True)
 
 # Get latest threads for an app ID with pagination
 def get_threads_by_app_id(app_id, limit=20, start_after=None):
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+from google.cloud import firestore
+from google.cloud.firestore_v1 import FieldFilter
+from app.db.firestore_helper import get_collection
+
+usage_stats_ref = get_collection("usage_stats")
+
+MAX_BATCH_WRITE = 500
+
+# Add metered assistant usage to per-app daily documents with Increment transforms.
+#   counters: {(app_id, "YYYY-MM-DD"): {"totals": {field: n}, "assistants": {assistant_id: {field: n}}}}
+def save_usage_counters(counters: dict):
+    now = datetime.now(timezone.utc)
+    writes = []
+
+    for (app_id, date), usage in counters.items():
+        data = {field: firestore.Increment(n) for field, n in usage["totals"].items()}
+        data["assistants"] = {
+            assistant_id: {field: firestore.Increment(n) for field, n in fields.items()}
+            for assistant_id, fields in usage["assistants"].items()
+        }
+        data.update({"app_id": app_id, "date": date, "updated_at": now})
+        writes.append((usage_stats_ref.document(f"{app_id}_{date}"), data))
+
+    client = usage_stats_ref._client
+    for i in range(0, len(writes), MAX_BATCH_WRITE):
+        batch = client.batch()
+        for doc_ref, data in writes[i:i + MAX_BATCH_WRITE]:
+            batch.set(doc_ref, data, merge=True)
+        batch.commit()
+    return len(writes)
+
+# Get daily usage for an app, newest first
+def get_usage_by_app(app_id, limit=30):
+    query = usage_stats_ref.where(filter=FieldFilter("app_id", "==", app_id)).order_by("date", direction=firestore.Query.DESCENDING).limit(limit)
+    return [doc.to_dict() for doc in query.stream()]
+
+# Get every app's usage for one day, most expensive first
+def get_usage_by_date(date, limit=20):
+    docs = [doc.to_dict() for doc in usage_stats_ref.where(filter=FieldFilter("date", "==", date)).stream()]
+    docs.sort(key=lambda d: (d.get("cost_usd", 0), d.get("total_tokens", 0)), reverse=True)
+    return docs[:limit]
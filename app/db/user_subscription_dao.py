@@ -46,7 +46,10 @@ def is_subscription_expired(expiry_at):
     if not expiry_at:
         return False
     try:
-        return datetime.utcnow() > datetime.fromisoformat(expiry_at)
+        expiry = datetime.fromisoformat(expiry_at)
+        # expiry_at is written timezone-aware; compare like with like
+        now = datetime.now(timezone.utc) if expiry.tzinfo else datetime.utcnow()
+        return now > expiry
     except Exception as e:
         print(f"[user_subscription_dao] Error parsing expiry_at: {e}")
         return True
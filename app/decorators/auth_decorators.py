@@ -7,16 +7,31 @@ import logging
 import hashlib
 import hmac
 
+_signing_keys = {}
+
+def _new_signer(secret):
+    """
+    Return a fresh HMAC-SHA256 object for `secret`. The keyed state (ipad/opad)
+    is computed once per secret and copied for every request.
+    """
+    base = _signing_keys.get(secret)
+    if base is None:
+        base = hmac.new(bytes(secret, "latin-1"), digestmod=hashlib.sha256)
+        _signing_keys[secret] = base
+    return base.copy()
+
 def validate_signature(payload, signature):
     """
-    Validate the incoming payload's signature against our expected signature
+    Validate the incoming payload's signature against our expected signature.
+    `payload` is the raw request body (bytes); str is accepted for compatibility.
     """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+
     # Use the App Secret to hash the payload
-    expected_signature = hmac.new(
-        bytes(current_app.config["APP_SECRET"], "latin-1"),
-        msg=payload.encode("utf-8"),
-        digestmod=hashlib.sha256,
-    ).hexdigest()
+    mac = _new_signer(current_app.config["APP_SECRET"])
+    mac.update(payload)
+    expected_signature = mac.hexdigest()
 
     # Check if the signature matches
     return hmac.compare_digest(expected_signature, signature)
@@ -31,7 +46,8 @@ def signature_required(f):
         signature = request.headers.get("X-Hub-Signature-256", "")[
             7:
         ]  # Removing 'sha256='
-        if not validate_signature(request.data.decode("utf-8"), signature):
+        # get_data() caches the body, so the handler reuses the same bytes
+        if not validate_signature(request.get_data(), signature):
             logging.info("Signature verification failed!")
             return jsonify({"status": "error", "message": "Invalid signature"}), 403
         return f(*args, **kwargs)
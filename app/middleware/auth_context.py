@@ -3,11 +3,12 @@ from flask import request, g, jsonify
 from app.db.app_dao import get_app_by_user_id
 from app.db.user_subscription_dao import get_user_subscription
 from app.utils.jwt_utils import decode_token
+from app.utils.app_snapshot import AppSnapshot
 
 def attach_app_context():
     """
-    Middleware-like function to attach app_id and subscription to Flask's `g` context
-    based on the user_id decoded from JWT.
+    Middleware-like function to attach the app snapshot, app_id and subscription to
+    Flask's `g` context based on the user_id decoded from JWT.
     """
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     if not token:
@@ -19,14 +20,16 @@ def attach_app_context():
         if not user_id:
             return jsonify({"error": "Invalid token"}), 401
 
-        app = get_app_by_user_id(user_id)
-        if not app:
+        apps = get_app_by_user_id(user_id, limit=1)
+        if not apps:
             return jsonify({"error": "No app registered for this user"}), 403
 
         subscription = get_user_subscription(user_id) or {"tier": "free"}
 
+        # Loaded once per request; pass g.app down instead of re-reading by app_id
+        g.app = AppSnapshot(apps[0])
         g.user_id = user_id
-        g.app_id = app.get("app_id")
+        g.app_id = g.app.app_id
         g.subscription = subscription
 
     except Exception as e:
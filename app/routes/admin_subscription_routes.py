@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app.db import subscription_dao
 from app.decorators.auth_decorators import super_admin_required
+from app.services.latency_budget import validate_latency_budget
 
 admin_subscription_bp = Blueprint("admin_subscription", __name__)
 
@@ -12,6 +13,7 @@ def create_subscription():
     price = data.get("price")
     duration_days = data.get("duration_days", 0)
     level = data.get("level", 1)
+    latency_budget = data.get("latency_budget")
 
     if not tier or price is None:
         return jsonify({"error": "'tier' and 'price' are required."}), 400
@@ -20,7 +22,13 @@ def create_subscription():
         return jsonify({"error": "The 'free' plan is reserved as the default and cannot be re-created."}), 400
 
     try:
-        subscription_dao.create_subscription(tier, price, level, duration_days)
+        if latency_budget is not None:
+            latency_budget = validate_latency_budget(latency_budget)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        subscription_dao.create_subscription(tier, price, level, duration_days, latency_budget)
         return jsonify({"message": f"Subscription tier '{tier}' created."}), 201
     except Exception as e:
         return jsonify({"error": f"Failed to create subscription: {str(e)}"}), 500
@@ -36,6 +44,11 @@ def update_subscription(plan_id):
         updates["duration_days"] = data["duration_days"]
     if "level" in data:
         updates["level"] = data["level"]
+    if "latency_budget" in data:
+        try:
+            updates["latency_budget"] = validate_latency_budget(data["latency_budget"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
     if not updates:
         return jsonify({"error": "No valid fields to update."}), 400
@@ -1,8 +1,10 @@
-from flask import Blueprint, request, jsonify, g
+import json
+from flask import Blueprint, Response, request, jsonify, g, stream_with_context
 from app.middleware.auth_context import with_app_context
 from app.db.message_template_dao import get_template_by_id
 from app.shared.whatsapp_sender import WhatsAppSender
 from app.shared.telegram_sender import TelegramSender
+from app.services.bulk_sender import BulkSender, BATCH_SEND_CONCURRENCY
 from app.utils.service_profile_helper import ServiceProfileHelper
 
 batch_routes = Blueprint("batch_routes", __name__, url_prefix="/api/v1/batch")
@@ -37,7 +39,7 @@ def send_batch_message():
         if len(recipients) > message_limit:
             return jsonify({"error": f"Your plan allows max {message_limit} messages per batch."}), 403
 
-    creds = ServiceProfileHelper.get_credentials(g.app_id)
+    creds = ServiceProfileHelper.get_credentials(g.app)
     whatsapp = creds.get("whatsapp", {})
     telegram = creds.get("telegram", {})
    
@@ -45,30 +47,52 @@ def send_batch_message():
         if platform == "whatsapp": 
             if whatsapp.get("token") and whatsapp.get("phone_number_id"):
                 print(whatsapp)
-                sender = WhatsAppSender(access_token=whatsapp.get("token"), phone_number_id=whatsapp.get("phone_number_id"), app_id=app_id,  subscription = subscription)  
+                sender = WhatsAppSender(access_token=whatsapp.get("token"), phone_number_id=whatsapp.get("phone_number_id"), app_id=app_id,  subscription = subscription, app=g.app)  
             else:
                 return jsonify({"error": "whatsapp token or phone number id not found"}), 400
         elif platform == "telegram":
             if telegram.get("token"):
-                sender = TelegramSender(access_token=telegram.get("token"), app_id=app_id,  subscription = subscription) 
+                sender = TelegramSender(bot_token=telegram.get("token"), app_id=app_id,  subscription = subscription, app=g.app) 
             else:
                 return jsonify({"error": "telegram token not found"}), 400 
         else:
             return jsonify({"error": "Unsupported platform"}), 400
 
+        bulk_sender = BulkSender(sender, concurrency=g.app.get("batch_send_concurrency") or BATCH_SEND_CONCURRENCY)
+        results = bulk_sender.send(recipients, content)
+
+        # ?stream=true: one JSON line per recipient (in request order), then the summary line
+        if request.args.get("stream", "false").lower() == "true":
+            return Response(stream_with_context(_stream_results(results, len(recipients))), mimetype="application/x-ndjson")
+
         success_count = 0
         failed_recipients = []
-        for r in recipients:
-            success = sender.send_text(r, content)
-            if success:
+        for result in results:
+            if result["success"]:
                 success_count += 1
             else:
-                failed_recipients.append(r)
+                failed_recipients.append(result["recipient"])
 
-        return jsonify({
-            "success": True,
-            "message": f"Sent to {success_count} out of {len(recipients)} recipients.",
-            "failed": failed_recipients
-        }), 200
+        return jsonify(_batch_summary(success_count, len(recipients), failed_recipients)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+def _batch_summary(success_count, total, failed_recipients):
+    return {
+        "success": True,
+        "message": f"Sent to {success_count} out of {total} recipients.",
+        "failed": failed_recipients
+    }
+
+
+def _stream_results(results, total):
+    success_count = 0
+    failed_recipients = []
+    for result in results:
+        if result["success"]:
+            success_count += 1
+        else:
+            failed_recipients.append(result["recipient"])
+        yield json.dumps(result) + "\n"
+    yield json.dumps(_batch_summary(success_count, total, failed_recipients)) + "\n"
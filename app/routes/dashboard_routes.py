@@ -1,7 +1,26 @@
 from flask import Blueprint, request, jsonify
 import os
 import jwt
+from datetime import datetime, timezone
 from app.db.metrics_dao import get_summary_metrics, get_all_daily_metrics, get_today_summary_metrics
+from app.db.delivery_status_dao import get_delivery_stats_by_app
+from app.db.usage_dao import get_usage_by_app, get_usage_by_date
+from app.services.webhook_queue import get_webhook_queue
+from app.services.status_aggregator import status_aggregator
+from app.services.event_dedup import event_dedup
+from app.services.chat_executor import chat_executor
+from app.services.message_debouncer import message_debouncer
+from app.services.run_manager import run_manager
+from app.services.turn_metrics import turn_metrics
+from app.services.thread_lifecycle import thread_lifecycle_metrics
+from app.services.usage_meter import usage_meter
+from app.services.openai_client_pool import openai_client_pool
+from app.services.thread_store import thread_store
+from app.services.answer_cache import answer_cache
+from app.services.outbound_limiter import outbound_limiter
+from app.utils.ttl_cache import cache_stats
+from app.utils.client_registry import client_registry
+from app.utils.http_sessions import http_pool_stats
 
 admin_dashboard = Blueprint("admin_dashboard", __name__, url_prefix="/api/v1/dashboard")
 JWT_SECRET = os.getenv("JWT_SECRET", "supersecret")
@@ -40,3 +59,106 @@ def get_today_summary():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@admin_dashboard.route("/webhook-queue", methods=["GET"])
+def webhook_queue_stats():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    queue = get_webhook_queue()
+    if not queue:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, "stats": queue.stats()}), 200
+
+@admin_dashboard.route("/webhook-queue/dead", methods=["POST"])
+def requeue_dead_webhooks():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    queue = get_webhook_queue()
+    if not queue:
+        return jsonify({"enabled": False}), 200
+    # {"ids": [...]} requeues those events; without ids every dead event is retried
+    ids = (request.get_json(silent=True) or {}).get("ids")
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+        return jsonify({"error": "ids must be a list of queue row ids"}), 400
+    return jsonify({"requeued": queue.requeue_dead(ids)}), 200
+
+@admin_dashboard.route("/webhook-queue/dead", methods=["DELETE"])
+def purge_dead_webhooks():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    queue = get_webhook_queue()
+    if not queue:
+        return jsonify({"enabled": False}), 200
+    older_than = int(request.args.get("older_than", 0))
+    return jsonify({"purged": queue.purge_dead(older_than)}), 200
+
+@admin_dashboard.route("/delivery", methods=["GET"])
+def delivery_stats():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    app_id = request.args.get("app_id")
+    if not app_id:
+        return jsonify({"error": "Missing required parameter: app_id"}), 400
+    limit = int(request.args.get("limit", 30))
+    data = get_delivery_stats_by_app(app_id, limit)
+    return jsonify({"delivery_stats": data, "aggregator": status_aggregator.stats()}), 200
+
+@admin_dashboard.route("/usage", methods=["GET"])
+def usage_stats():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    app_id = request.args.get("app_id")
+    if not app_id:
+        return jsonify({"error": "Missing required parameter: app_id"}), 400
+    limit = int(request.args.get("limit", 30))
+    data = get_usage_by_app(app_id, limit)
+    return jsonify({"usage": data, "meter": usage_meter.stats()}), 200
+
+@admin_dashboard.route("/usage/top", methods=["GET"])
+def top_usage():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    date = request.args.get("date") or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    limit = int(request.args.get("limit", 20))
+    return jsonify({"date": date, "apps": get_usage_by_date(date, limit)}), 200
+
+@admin_dashboard.route("/caches", methods=["GET"])
+def caches_stats():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({
+        "caches": cache_stats(),
+        "webhook_dedup": event_dedup.stats(),
+        "openai_clients": openai_client_pool.stats(),
+        "thread_store": thread_store.stats(),
+        "answers": answer_cache.stats()
+    }), 200
+
+@admin_dashboard.route("/chat-executor", methods=["GET"])
+def chat_executor_stats():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    top = int(request.args.get("top", 20))
+    return jsonify({"chat_executor": chat_executor.stats(top=top), "debouncer": message_debouncer.stats()}), 200
+
+@admin_dashboard.route("/runs", methods=["GET"])
+def assistant_run_stats():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({"runs": run_manager.stats(), "turns": turn_metrics.stats(), "threads": thread_lifecycle_metrics.stats()}), 200
+
+@admin_dashboard.route("/clients", methods=["GET"])
+def client_health():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    # ?probe=false reports which clients this worker has created without calling out
+    if request.args.get("probe", "true").lower() == "false":
+        return jsonify({**client_registry.stats(), "http_pools": http_pool_stats()}), 200
+    health = client_registry.health()
+    status = 503 if any(result["status"] == "error" for result in health.values()) else 200
+    return jsonify({"health": health, **client_registry.stats(), "http_pools": http_pool_stats()}), status
+
+@admin_dashboard.route("/outbound", methods=["GET"])
+def outbound_rate_limits():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({"rate_limits": outbound_limiter.stats()}), 200
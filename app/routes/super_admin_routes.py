@@ -1,6 +1,7 @@
 from flask import Blueprint, request,g, jsonify
 from app.db.user_dao import create_user, get_user_by_email, get_user_by_id, delete_user, list_admins, list_users, update_user
 from app.db.subscription_dao import create_subscription, update_subscription
+from app.services.latency_budget import validate_latency_budget
 from app.decorators.auth_decorators import super_admin_required, admin_required, admin_auth_required
 from app.utils.password_utils import hash_password
 from app.db.token_blacklist import blacklist_token
@@ -126,11 +127,16 @@ def create_subscription_plan():
         price = data.get("price")
         level = data.get("level")
         duration_days = data.get("duration_days")
+        latency_budget = data.get("latency_budget")
 
         if not tier or price is None or level is None or duration_days is None:
             return jsonify({"success": False, "message": "Missing required fields"}), 400
+        try:
+            latency_budget = validate_latency_budget(latency_budget)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
 
-        plan = create_subscription(tier, price, level, duration_days)
+        plan = create_subscription(tier, price, level, duration_days, latency_budget)
         return jsonify({"success": True, "plan": plan}), 201
 
     except Exception as e:
@@ -141,6 +147,11 @@ def create_subscription_plan():
 def update_subscription_plan(plan_id):
     try:
         updates = request.json
+        if "latency_budget" in updates:
+            try:
+                updates["latency_budget"] = validate_latency_budget(updates["latency_budget"])
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
         update_subscription(plan_id, updates)
         return jsonify({"success": True, "message": "Subscription plan updated"}), 200
 
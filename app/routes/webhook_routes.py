@@ -1,19 +1,24 @@
 import logging
-import json
 from flask import Blueprint, request, jsonify, current_app
 from app.decorators.auth_decorators import signature_required
 from app.utils.message_utils import (
     is_valid_whatsapp_message,
 )
+from app.utils.webhook_envelope import WebhookEnvelope, loads
+from app.utils.app_snapshot import AppSnapshot
 
 from app.shared.telegram_sender import TelegramSender
 from app.shared.whatsapp_sender import WhatsAppSender
 from app.db.app_dao import get_app_by_app_token, get_app_by_waba_phone_id
+from app.db.firestore_helper import get_batch
+from app.services.webhook_queue import get_webhook_queue
+from app.services.status_aggregator import status_aggregator
+from app.services.event_dedup import event_dedup
 from flask import g
 
 webhook_blueprint = Blueprint("webhook", __name__)
 
-def handle_message():
+def handle_message(envelope):
     """
     Handle incoming webhook events from the WhatsApp API.
 
@@ -24,55 +29,78 @@ def handle_message():
 
     Every message send will trigger 4 HTTP requests to your webhook: message, sent, delivered, read.
 
+    Args:
+        envelope: The WebhookEnvelope built from the request body.
+
     Returns:
         response: A tuple containing a JSON response and an HTTP status code.
     """
-    body = request.get_json()
-    # logging.info(f"request body: {body}")
-
-    # Check if it's a WhatsApp status update
-    if (
-        body.get("entry", [{}])[0]
-        .get("changes", [{}])[0]
-        .get("value", {})
-        .get("statuses")
-    ):
-        logging.info("Received a WhatsApp status update.")
-        return jsonify({"status": "ok"}), 200
+    # logging.info(f"request body: {envelope.body}")
 
     try:
-        if is_valid_whatsapp_message(body):
-            try:
-                phone_number_id = body["entry"][0]["changes"][0]["value"]["metadata"]["phone_number_id"]
-            except (KeyError, IndexError):
-                return jsonify({"error": "Missing phone_number_id in webhook payload"}), 400
-            
-            app = get_app_by_waba_phone_id(phone_number_id)
-            if not app:
-                return jsonify({"error": "Invalid phone_number_id or app not found"}), 403
-
-            app_id = app.get("app_id")
-            subscription = app.get("subscription", {"tier": "free"})
-            
-            whatsapp_bot = WhatsAppSender( 
-                access_token=current_app.config['ACCESS_TOKEN'],
-                phone_number_id=current_app.config['PHONE_NUMBER_ID'],
-                app_id = app_id,
-                subscription = subscription
-            )
+        # Delivery/read statuses are buffered and flushed to Firestore in batches
+        status_count = status_aggregator.add_from_webhook(envelope)
+
+        if is_valid_whatsapp_message(envelope):
+            # One app lookup per receiving number, one Firestore batch per webhook
+            messages_by_phone = envelope.messages_by_phone
+            results = []
+            resolved_apps = 0
+            claimed_ids = []     # released again if this webhook's messages are not saved
+            pending_turns = []   # started only once the batch holding their messages is committed
+
             try:
-                result = whatsapp_bot.handle_message(body)
-                return jsonify({"status": "ok", "result":result}), 200
+                batch = get_batch()
+                for phone_number_id, items in messages_by_phone.items():
+                    if not phone_number_id:
+                        logging.warning(f"Skipping {len(items)} message(s) without phone_number_id")
+                        continue
+
+                    app = get_app_by_waba_phone_id(phone_number_id)
+                    if not app:
+                        logging.warning(f"No app found for phone_number_id {phone_number_id}, skipping {len(items)} message(s)")
+                        continue
+                    resolved_apps += 1
+
+                    whatsapp_bot = WhatsAppSender( 
+                        access_token=current_app.config['ACCESS_TOKEN'],
+                        phone_number_id=current_app.config['PHONE_NUMBER_ID'],
+                        app=AppSnapshot(app)
+                    )
+                    for contact, message in items:
+                        if event_dedup.is_duplicate("whatsapp", message.get("id")):
+                            results.append({"id": message.get("id"), "duplicate": True})
+                            continue
+                        claimed_ids.append(message.get("id"))
+                        results.append(whatsapp_bot.handle_message(message, contact, batch=batch, pending_turns=pending_turns))
+
+                if not resolved_apps:
+                    return jsonify({"error": "Invalid phone_number_id or app not found"}), 403
+
+                batch.commit()
             except Exception as e:
-                logging.exception("Failed to handle WhatsApp message")
+                # Nothing was saved or answered; release the claims so the redelivery is processed
+                logging.exception("Failed to process WhatsApp messages")
+                for message_id in claimed_ids:
+                    event_dedup.release("whatsapp", message_id)
                 return jsonify({"error": str(e)}), 500
+
+            for start_turn in pending_turns:
+                try:
+                    start_turn()
+                except Exception:
+                    logging.exception("Failed to start assistant turn")
+            return jsonify({"status": "ok", "result": results}), 200
+
+        elif status_count:
+            return jsonify({"status": "ok", "statuses": status_count}), 200
         else:
             # if the request is not a WhatsApp API event, return an error
             return (
                 jsonify({"status": "error", "message": "Not a WhatsApp API event"}),
                 404,
             )
-    except json.JSONDecodeError:
+    except ValueError:
         logging.error("Failed to decode JSON")
         return jsonify({"status": "error", "message": "Invalid JSON provided"}), 400
 
@@ -107,10 +135,69 @@ def verify():
 def webhook_get():
     return verify()
 
+def handle_telegram_update(app_token, data, bot_token=None):
+    """
+    Resolve the app for `app_token` and hand the Telegram update to its bot.
+    Used by the webhook route, the queue workers and the long-polling runner.
+    """
+    app = get_app_by_app_token(app_token)
+    if not app:
+        return jsonify({"error": "Invalid app_token or app not found"}), 403
+
+    snapshot = AppSnapshot(app)
+    app_id = snapshot.app_id
+
+    update_id = data.get("update_id")
+    event_id = f"{app_id}:{update_id}" if update_id is not None else None
+    if event_dedup.is_duplicate("telegram", event_id):
+        return jsonify({"status": "ok", "duplicate": True}), 200
+
+    telegram_bot = TelegramSender(
+        bot_token or current_app.config["TELEGRAM_BOT_TOKEN"], 
+        app=snapshot
+    )
+    try:
+        result = telegram_bot.handle_message(data)
+    except Exception:
+        event_dedup.release("telegram", event_id)
+        raise
+    return jsonify({"status": "ok", "result": result}), 200
+
+
+def register_webhook_handlers(queue):
+    """
+    Wire the queue workers to the same handlers used by the inline webhook path.
+    """
+    queue.register_handler("whatsapp", lambda payload, meta: _raise_on_server_error(
+        "whatsapp", handle_message(WebhookEnvelope.from_bytes(payload))
+    ))
+    queue.register_handler("telegram", lambda payload, meta: _raise_on_server_error(
+        "telegram", handle_telegram_update(meta["app_token"], loads(payload))
+    ))
+
+
+def _raise_on_server_error(kind, result):
+    # The handlers report failures as (response, status); the queue only retries on exceptions
+    response, status = result
+    if status >= 500:
+        raise RuntimeError(f"{kind} webhook handler returned {status}: {response.get_data(as_text=True)}")
+    return result
+
+
 @webhook_blueprint.route("/webhook", methods=["POST"])
 @signature_required
 def webhook_post():
-    return handle_message()
+    queue = get_webhook_queue()
+    if queue:
+        # Ack-first: persist the verified payload and let the workers process it
+        queue.enqueue("whatsapp", request.get_data())
+        return jsonify({"status": "queued"}), 200
+    try:
+        envelope = WebhookEnvelope.from_bytes(request.get_data())
+    except ValueError:
+        logging.error("Failed to decode JSON")
+        return jsonify({"status": "error", "message": "Invalid JSON provided"}), 400
+    return handle_message(envelope)
 
 @webhook_blueprint.route("/telegram/webhook", methods=["POST"])
 def telegram_webhook_post():   
@@ -119,22 +206,12 @@ def telegram_webhook_post():
         if not app_token:
             return jsonify({"error": "Missing app_token in query"}), 400
 
-        app = get_app_by_app_token(app_token)
-        if not app:
-            return jsonify({"error": "Invalid app_token or app not found"}), 403
-        
-        app_id = app.get("app_id")
-        subscription = app.get("subscription", {"tier": "free"})
-        
-        telegram_bot = TelegramSender(
-            current_app.config["TELEGRAM_BOT_TOKEN"], 
-            app_id=app_id,
-            subscription=subscription
-        )
-        data = request.get_json()
-        result = telegram_bot.handle_message(data)
-        
-        return jsonify({"status": "ok", "result": result}), 200
+        queue = get_webhook_queue()
+        if queue:
+            queue.enqueue("telegram", request.get_data(), {"app_token": app_token})
+            return jsonify({"status": "queued"}), 200
+
+        return handle_telegram_update(app_token, loads(request.get_data()))
     except Exception as e:
         logging.error(f"Webhook error: {e}")
         return jsonify({"error": "Something went wrong"}), 500
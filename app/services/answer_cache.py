@@ -0,0 +1,99 @@
+import logging
+import os
+import re
+import threading
+import unicodedata
+from app.utils.ttl_cache import TTLCache
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"  # default for apps without the setting
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_SIZE = int(os.getenv("ANSWER_CACHE_MAX_SIZE", "1000"))  # answers kept per app and assistant
+MAX_QUESTION_LENGTH = 300  # long messages are rarely repeated verbatim
+DEFAULT_APP_ID = "default"
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """Casefold, strip punctuation and collapse whitespace so trivially different phrasings share a key."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class AnswerCache:
+    """
+    Opt-in cache of assistant answers keyed by (app_id, assistant_id, normalized question).
+
+    Meant for FAQ-style bots: a repeated plain-text question is answered from
+    memory instead of starting a run. Only turns that do not depend on earlier
+    context are cached - the caller checks that the chat's thread has no turns
+    yet (a cached answer is not added to the thread, so it stays empty). Each
+    app gets its own LRU+TTL cache per assistant, sized and timed by that app's
+    `answer_cache_enabled`, `answer_cache_ttl`, `answer_cache_max_size`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caches = {}   # (app_id, assistant_id) -> TTLCache
+
+    def key_for(self, app, assistant_id, messages):
+        """Return the cache key for a turn, or None if the turn is not cacheable for this app."""
+        enabled = app.get("answer_cache_enabled", ANSWER_CACHE_ENABLED) if app else ANSWER_CACHE_ENABLED
+        if not enabled or not assistant_id or len(messages) != 1:
+            return None
+        message = messages[0]
+        body = message.get("message_body")
+        if message.get("image_path") or message.get("file_path") or not isinstance(body, str):
+            return None
+        if len(body) > MAX_QUESTION_LENGTH:
+            return None
+        question = normalize_question(body)
+        app_id = (app.app_id if app else None) or DEFAULT_APP_ID
+        return (app_id, assistant_id, question) if question else None
+
+    def _cache(self, app_id, assistant_id, app=None):
+        maxsize = (app.get("answer_cache_max_size") if app else None) or ANSWER_CACHE_MAX_SIZE
+        ttl = (app.get("answer_cache_ttl") if app else None) or ANSWER_CACHE_TTL
+        with self._lock:
+            cache = self._caches.get((app_id, assistant_id))
+            if cache is None or cache.maxsize != maxsize or cache.ttl != ttl:
+                # New, or the app's settings changed since the cache was built
+                cache = TTLCache(f"answers:{app_id}:{assistant_id}", maxsize=maxsize, ttl=ttl, register=False)
+                self._caches[(app_id, assistant_id)] = cache
+            return cache
+
+    def get(self, key, app=None):
+        return self._cache(key[0], key[1], app).get(key[2])
+
+    def set(self, key, answer, app=None):
+        self._cache(key[0], key[1], app).set(key[2], answer)
+
+    def invalidate(self, assistant_id):
+        """Drop every cached answer of an assistant, for every app (its instructions or files changed)."""
+        with self._lock:
+            keys = [key for key in self._caches if key[1] == assistant_id]
+            caches = [self._caches.pop(key) for key in keys]
+        dropped = sum(len(cache) for cache in caches)
+        if dropped:
+            logging.info(f"[AnswerCache] Invalidated {dropped} answer(s) for assistant {assistant_id}")
+
+    def stats(self):
+        with self._lock:
+            caches = dict(self._caches)
+        per_cache = {f"{app_id}:{assistant_id}": cache.stats() for (app_id, assistant_id), cache in caches.items()}
+        hits = sum(s["hits"] for s in per_cache.values())
+        misses = sum(s["misses"] for s in per_cache.values())
+        return {
+            "default_enabled": ANSWER_CACHE_ENABLED,
+            "caches": len(per_cache),
+            "answers": sum(s["size"] for s in per_cache.values()),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            "by_app_assistant": per_cache,
+        }
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+import aiohttp
+from app.utils.http_sessions import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+from app.services.outbound_limiter import outbound_limiter
+
+BATCH_SEND_CONCURRENCY = int(os.getenv("BATCH_SEND_CONCURRENCY", "50"))
+_DONE = object()
+
+
+class BulkSender:
+    """
+    Sends one text message to many recipients concurrently.
+
+    Each request is built by the platform sender (`text_request`) and sent over
+    a single aiohttp session with at most `concurrency` requests in flight, on
+    an event loop in a background thread, paced by the sender's rate limits
+    (throttled sends wait and are retried). `send()` yields per-recipient results
+    in recipient order as soon as every earlier recipient has finished, so a
+    caller can stream them while the rest of the batch is still in flight.
+    """
+
+    def __init__(self, sender, concurrency=BATCH_SEND_CONCURRENCY):
+        self.sender = sender
+        self.concurrency = max(1, concurrency)
+
+    def send(self, recipients, message):
+        """Yield {"recipient", "success", "status", "error"} per recipient, in order."""
+        recipients = list(recipients)
+        results = queue.Queue()
+        start = time.monotonic()
+
+        def run():
+            try:
+                asyncio.run(self._send_all(recipients, message, results))
+            except Exception as e:
+                logging.error(f"[BulkSender] Batch aborted: {e}")
+            finally:
+                results.put(_DONE)
+
+        threading.Thread(target=run, name="bulk-send", daemon=True).start()
+
+        pending = {}
+        next_index = 0
+        sent = 0
+        while next_index < len(recipients):
+            item = results.get()
+            if item is _DONE:
+                break
+            index, result = item
+            pending[index] = result
+            while next_index in pending:
+                result = pending.pop(next_index)
+                sent += result["success"]
+                next_index += 1
+                yield result
+
+        # Only reached if the loop died before every recipient had a result
+        for recipient in recipients[next_index:]:
+            yield {"recipient": recipient, "success": False, "status": None, "error": "not sent"}
+
+        duration = time.monotonic() - start
+        logging.info(f"[BulkSender] Sent {sent}/{len(recipients)} in {duration:.2f}s ({len(recipients) / duration if duration else 0:.1f} msg/s)")
+
+    async def _send_all(self, recipients, message, results):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            async def send_one(index, recipient):
+                async with semaphore:
+                    results.put((index, await self._send_one(session, recipient, message)))
+
+            await asyncio.gather(*(send_one(index, recipient) for index, recipient in enumerate(recipients)))
+
+    async def _send_one(self, session, recipient, message):
+        try:
+            url, headers, payload = self.sender.text_request(recipient, message)
+            attempt = 0
+            while True:
+                wait = outbound_limiter.reserve(self.sender.rate_limits(recipient))
+                if wait:
+                    await asyncio.sleep(wait)
+                async with session.post(url, headers=headers, json=payload) as response:
+                    if response.status < 400:
+                        return {"recipient": recipient, "success": True, "status": response.status, "error": None}
+                    body = await response.text()
+                    if self.sender.should_retry(recipient, response.status, response.headers, body, attempt):
+                        attempt += 1
+                        continue
+                    logging.info(f"[BulkSender] Send to {recipient} failed: {response.status} {body[:200]}")
+                    return {"recipient": recipient, "success": False, "status": response.status, "error": body[:200]}
+        except Exception as e:
+            logging.info(f"[BulkSender] Send to {recipient} failed: {e!r}")
+            return {"recipient": recipient, "success": False, "status": None, "error": str(e) or type(e).__name__}
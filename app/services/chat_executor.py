@@ -0,0 +1,121 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+CHAT_EXECUTOR_WORKERS = int(os.getenv("CHAT_EXECUTOR_WORKERS", "32"))
+
+
+class KeyedExecutor:
+    """
+    Runs tasks strictly in order per key (chat) and in parallel across keys.
+
+    Each key owns a FIFO queue. The first task submitted for an idle key
+    schedules a drain on the shared thread pool; tasks submitted while that
+    drain is active are appended and picked up by the same drain, so two
+    messages from one chat can never race on the same OpenAI thread, while
+    other chats keep running on the remaining workers.
+
+    A task may return a concurrent.futures.Future; the chat then stays
+    blocked until the future resolves, without holding a worker thread.
+    """
+
+    def __init__(self, max_workers=CHAT_EXECUTOR_WORKERS, name="chat"):
+        self.max_workers = max_workers
+        self.name = name
+        self._lock = threading.Lock()
+        self._queues = {}   # key -> deque of pending (fn, args, kwargs, enqueued_at)
+        self._running = set()
+        self._pool = None
+        self._pid = None
+
+        # metrics
+        self.submitted_total = 0
+        self.completed_total = 0
+        self.failed_total = 0
+        self._wait_time_total = 0.0
+
+    def _get_pool(self):
+        # Thread pools do not survive fork, so create one per process
+        if self._pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-executor")
+            self._pid = os.getpid()
+        return self._pool
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self.submitted_total += 1
+            queue = self._queues.get(key)
+            task = (fn, args, kwargs, time.monotonic())
+            if queue is not None:
+                queue.append(task)
+                return
+            self._queues[key] = deque([task])
+            self._get_pool().submit(self._drain, key)
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                queue = self._queues.get(key)
+                if not queue:
+                    self._queues.pop(key, None)
+                    self._running.discard(key)
+                    return
+                fn, args, kwargs, enqueued_at = queue.popleft()
+                self._running.add(key)
+                self._wait_time_total += time.monotonic() - enqueued_at
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                logging.exception(f"[ChatExecutor] Task for {key} failed: {e}")
+                with self._lock:
+                    self.failed_total += 1
+                continue
+
+            if isinstance(result, Future):
+                # Async task (e.g. a run on the run manager loop): free this worker and
+                # resume the chat's queue when it finishes, keeping per-chat order
+                result.add_done_callback(lambda future, key=key: self._resume(key, future))
+                return
+            with self._lock:
+                self.completed_total += 1
+
+    def _resume(self, key, future):
+        error = future.exception() if not future.cancelled() else None
+        with self._lock:
+            if future.cancelled() or error:
+                self.failed_total += 1
+            else:
+                self.completed_total += 1
+        if error:
+            logging.error(f"[ChatExecutor] Async task for {key} failed: {error!r}")
+        self._get_pool().submit(self._drain, key)
+
+    def depth(self, key):
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is None:
+                return 0
+            return len(queue) + (1 if key in self._running else 0)
+
+    def stats(self, top=20):
+        with self._lock:
+            depths = {key: len(queue) + (1 if key in self._running else 0) for key, queue in self._queues.items()}
+            started = self.completed_total + self.failed_total + len(self._running)
+            return {
+                "max_workers": self.max_workers,
+                "active_chats": len(self._running),
+                "queued_chats": len(depths),
+                "queued_tasks": sum(depths.values()),
+                "submitted_total": self.submitted_total,
+                "completed_total": self.completed_total,
+                "failed_total": self.failed_total,
+                "avg_queue_wait_seconds": round(self._wait_time_total / started, 3) if started else None,
+                "deepest_chats": dict(sorted(depths.items(), key=lambda kv: kv[1], reverse=True)[:top]),
+            }
+
+
+chat_executor = KeyedExecutor()
@@ -0,0 +1,78 @@
+import logging
+import os
+import threading
+from app.db.processed_event_dao import mark_event_processed, release_event
+from app.utils.ttl_cache import TTLCache
+
+DEDUP_TTL_SECONDS = int(os.getenv("WEBHOOK_DEDUP_TTL", "3600"))
+DEDUP_MAX_SIZE = int(os.getenv("WEBHOOK_DEDUP_MAX_SIZE", "100000"))
+DEDUP_BACKEND = os.getenv("WEBHOOK_DEDUP_BACKEND", "memory")  # "memory" or "firestore"
+
+
+class EventDeduplicator:
+    """
+    Drops webhook events that WhatsApp/Telegram redeliver.
+
+    A local LRU+TTL set answers repeated ids in O(1). With the "firestore"
+    backend, first-seen ids are also claimed with an atomic document create, so
+    every gunicorn worker (and container) agrees on which copy gets processed.
+    A claim whose processing fails is given back with `release()`, so the
+    platform's redelivery (or a queue retry) is not mistaken for a duplicate.
+    """
+
+    def __init__(self, ttl=DEDUP_TTL_SECONDS, maxsize=DEDUP_MAX_SIZE, backend=DEDUP_BACKEND):
+        self.cache = TTLCache("webhook_dedup", maxsize=maxsize, ttl=ttl)
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.shared_hits = 0
+        self.shared_errors = 0
+
+    def is_duplicate(self, platform, event_id):
+        """Return True if this event was already seen. The first call for an id claims it."""
+        if event_id is None:
+            return False
+        key = f"{platform}:{event_id}"
+
+        if not self.cache.add(key):
+            logging.info(f"[Dedup] Dropping redelivered {platform} event {event_id}")
+            return True
+
+        if self.backend == "firestore":
+            try:
+                if not mark_event_processed(key, self.cache.ttl):
+                    with self._lock:
+                        self.shared_hits += 1
+                    logging.info(f"[Dedup] {platform} event {event_id} already claimed by another worker")
+                    return True
+            except Exception as e:
+                # Fail open: a duplicate reply is better than a lost message
+                with self._lock:
+                    self.shared_errors += 1
+                logging.warning(f"[Dedup] Shared store unavailable, using local cache only: {e}")
+        return False
+
+    def release(self, platform, event_id):
+        """Forget a claimed event after its processing failed."""
+        if event_id is None:
+            return
+        key = f"{platform}:{event_id}"
+        self.cache.delete(key)
+        if self.backend == "firestore":
+            try:
+                release_event(key)
+            except Exception as e:
+                with self._lock:
+                    self.shared_errors += 1
+                logging.warning(f"[Dedup] Could not release {key}; redeliveries will be dropped until it expires: {e}")
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats.update({
+            "backend": self.backend,
+            "shared_hits": self.shared_hits,
+            "shared_errors": self.shared_errors,
+        })
+        return stats
+
+
+event_dedup = EventDeduplicator()
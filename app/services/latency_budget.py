@@ -0,0 +1,96 @@
+import logging
+import os
+from app.db.subscription_dao import get_subscription_by_id
+from app.db.user_subscription_dao import get_user_subscription, is_subscription_expired
+from app.utils.ttl_cache import TTLCache
+
+# Budget for apps whose owner has no (valid) plan or whose plan sets none, i.e. the free tier
+DEFAULT_SOFT_DEADLINE = float(os.getenv("LATENCY_BUDGET_SOFT_SECONDS", "20"))
+DEFAULT_HARD_DEADLINE = float(os.getenv("LATENCY_BUDGET_HARD_SECONDS", "120"))
+DEFAULT_PRIORITY = int(os.getenv("LATENCY_BUDGET_PRIORITY", "0"))
+LATENCY_BUDGET_CACHE_TTL = int(os.getenv("LATENCY_BUDGET_CACHE_TTL", "300"))
+
+STILL_WORKING_MESSAGE = "Still working on your request, thanks for your patience..."
+FALLBACK_REPLY = "Sorry, this is taking longer than expected. Please try again in a moment."
+
+budgets_by_owner_cache = TTLCache("latency_budgets", maxsize=10000, ttl=LATENCY_BUDGET_CACHE_TTL)
+
+
+class LatencyBudget:
+    """
+    How long a turn may take for an app's plan.
+
+    After `soft_seconds` the user gets an interim message, after `hard_seconds`
+    the run is cancelled and a fallback reply is sent. Turns with a higher
+    `priority` are admitted first when the run manager is saturated.
+    """
+
+    __slots__ = ("soft_seconds", "hard_seconds", "priority")
+
+    def __init__(self, soft_seconds=DEFAULT_SOFT_DEADLINE, hard_seconds=DEFAULT_HARD_DEADLINE, priority=DEFAULT_PRIORITY):
+        self.soft_seconds = soft_seconds
+        self.hard_seconds = hard_seconds
+        self.priority = priority
+
+    @classmethod
+    def from_plan(cls, plan):
+        settings = (plan or {}).get("latency_budget") or {}
+        return cls(
+            soft_seconds=float(settings.get("soft_seconds", DEFAULT_SOFT_DEADLINE)),
+            hard_seconds=float(settings.get("hard_seconds", DEFAULT_HARD_DEADLINE)),
+            priority=int(settings.get("priority", DEFAULT_PRIORITY)),
+        )
+
+    def to_dict(self):
+        return {"soft_seconds": self.soft_seconds, "hard_seconds": self.hard_seconds, "priority": self.priority}
+
+
+def validate_latency_budget(settings):
+    """
+    Return a cleaned latency_budget dict for a subscription plan, or raise ValueError.
+    None is kept as None: it clears the plan's budget, which then uses the defaults.
+    """
+    if settings is None:
+        return None
+    if not isinstance(settings, dict):
+        raise ValueError("latency_budget must be an object")
+    unknown = set(settings) - {"soft_seconds", "hard_seconds", "priority"}
+    if unknown:
+        raise ValueError(f"Unknown latency_budget fields: {sorted(unknown)}")
+    # Checked as given, not coerced: bool is an int subclass and int(2.7) would silently be 2
+    for field in ("soft_seconds", "hard_seconds"):
+        if field in settings and (isinstance(settings[field], bool) or not isinstance(settings[field], (int, float))):
+            raise ValueError(f"latency_budget.{field} must be a number")
+    if "priority" in settings and (isinstance(settings["priority"], bool) or not isinstance(settings["priority"], int)):
+        raise ValueError("latency_budget.priority must be an integer")
+    budget = LatencyBudget.from_plan({"latency_budget": settings})
+    if budget.hard_seconds <= 0 or budget.soft_seconds <= 0:
+        raise ValueError("latency_budget deadlines must be positive")
+    if budget.soft_seconds >= budget.hard_seconds:
+        raise ValueError("soft_seconds must be lower than hard_seconds")
+    return budget.to_dict()
+
+
+def get_latency_budget(app):
+    """Resolve the latency budget of an app (AppSnapshot) from its owner's subscription plan."""
+    owner_id = app.get("owner_id") if app else None
+    if not owner_id:
+        return LatencyBudget()
+
+    budget = budgets_by_owner_cache.get(owner_id)
+    if budget is not None:
+        return budget
+
+    plan = None
+    try:
+        subscription = get_user_subscription(owner_id)
+        if subscription and not is_subscription_expired(subscription.get("expiry_at")):
+            # The user's subscription holds a copy of the plan taken at purchase; prefer the live plan
+            plan = get_subscription_by_id(subscription.get("plan_id")) if subscription.get("plan_id") else None
+            plan = plan or subscription
+    except Exception as e:
+        logging.warning(f"[LatencyBudget] Could not load plan for owner {owner_id}, using defaults: {e}")
+
+    budget = LatencyBudget.from_plan(plan)
+    budgets_by_owner_cache.set(owner_id, budget)
+    return budget
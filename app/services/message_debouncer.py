@@ -0,0 +1,88 @@
+import logging
+import os
+import threading
+import time
+
+MESSAGE_DEBOUNCE_SECONDS = float(os.getenv("MESSAGE_DEBOUNCE_SECONDS", "0"))  # 0 disables coalescing
+MAX_DEBOUNCE_FACTOR = 4  # a burst is flushed at the latest after 4 windows
+
+
+class MessageDebouncer:
+    """
+    Coalesces bursts of messages from the same chat into one assistant turn.
+
+    Every message restarts the chat's window; when no new message arrives for
+    `window` seconds (or the burst has lasted MAX_DEBOUNCE_FACTOR windows), the
+    flush callback receives all buffered items at once.
+    """
+
+    def __init__(self, window=MESSAGE_DEBOUNCE_SECONDS):
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = {}   # key -> {"items", "flush", "first_at", "gen", "timer"}
+
+        # metrics
+        self.messages_total = 0
+        self.flushes_total = 0
+
+    def submit(self, key, item, flush, window=None):
+        """
+        Buffer `item` for `key`; `flush(items)` is called once the window closes.
+        Items under one key are flushed together through the latest `flush`, so the
+        key must identify a single destination (app and chat).
+        """
+        window = self.window if window is None else window
+        with self._lock:
+            self.messages_total += 1
+            if window <= 0:
+                self.flushes_total += 1
+                entry = None
+            else:
+                now = time.monotonic()
+                entry = self._pending.get(key)
+                if entry is None:
+                    entry = {"items": [], "first_at": now, "gen": 0, "timer": None}
+                    self._pending[key] = entry
+                elif entry["timer"]:
+                    entry["timer"].cancel()
+
+                entry["items"].append(item)
+                entry["flush"] = flush
+                entry["gen"] += 1
+                delay = max(0, min(window, entry["first_at"] + window * MAX_DEBOUNCE_FACTOR - now))
+                timer = threading.Timer(delay, self._fire, args=(key, entry, entry["gen"]))
+                timer.daemon = True
+                entry["timer"] = timer
+                timer.start()
+
+        if entry is None:
+            flush([item])
+
+    def _fire(self, key, entry, gen):
+        with self._lock:
+            # A timer that lost the race with a newer message is stale
+            if self._pending.get(key) is not entry or entry["gen"] != gen:
+                return
+            del self._pending[key]
+            self.flushes_total += 1
+
+        items = entry["items"]
+        if len(items) > 1:
+            logging.info(f"[Debounce] Coalesced {len(items)} messages for {key} into one turn")
+        try:
+            entry["flush"](items)
+        except Exception as e:
+            logging.exception(f"[Debounce] Flush failed for {key}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window_seconds": self.window,
+                "buffered_chats": len(self._pending),
+                "messages_total": self.messages_total,
+                "turns_total": self.flushes_total,
+                "runs_saved": self.messages_total - self.flushes_total - sum(len(e["items"]) for e in self._pending.values()),
+            }
+
+
+message_debouncer = MessageDebouncer()
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from openai import OpenAI, AsyncOpenAI
+
+OPENAI_CLIENT_POOL_SIZE = int(os.getenv("OPENAI_CLIENT_POOL_SIZE", "256"))
+
+
+class OpenAITenant:
+    """
+    The OpenAI account an app talks to: its API key, assistant and the pooled
+    sync/async clients for that key.
+    """
+
+    __slots__ = ("api_key", "assistant_id", "client", "async_client")
+
+    def __init__(self, api_key, assistant_id, client, async_client):
+        self.api_key = api_key
+        self.assistant_id = assistant_id
+        self.client = client
+        self.async_client = async_client
+
+    @property
+    def key_id(self):
+        """Short, non-reversible id of the API key for logs and metrics."""
+        return key_fingerprint(self.api_key)
+
+
+def key_fingerprint(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12] if api_key else None
+
+
+class OpenAIClientPool:
+    """
+    Lazily creates one OpenAI/AsyncOpenAI client pair per distinct API key.
+
+    Each client owns an HTTP connection pool, so requests for the same tenant
+    reuse warm connections and tenants get isolated rate-limit handling. The
+    least recently used tenants are evicted (and their sync client closed)
+    once `maxsize` keys are held.
+    """
+
+    def __init__(self, maxsize=OPENAI_CLIENT_POOL_SIZE):
+        self.maxsize = maxsize
+        self._clients = OrderedDict()   # api_key -> (OpenAI, AsyncOpenAI)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, api_key):
+        if self._pid != os.getpid():
+            # Connection pools inherited through fork are unusable; start empty in the child
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._clients = OrderedDict()
+        with self._lock:
+            pair = self._clients.get(api_key)
+            if pair is not None:
+                self._clients.move_to_end(api_key)
+                self.hits += 1
+                return pair
+
+            self.misses += 1
+            pair = (OpenAI(api_key=api_key), AsyncOpenAI(api_key=api_key))
+            self._clients[api_key] = pair
+            while len(self._clients) > self.maxsize:
+                evicted_key, (evicted_client, _) = self._clients.popitem(last=False)
+                self.evictions += 1
+                try:
+                    evicted_client.close()
+                except Exception as e:
+                    logging.warning(f"[OpenAIClientPool] Failed to close client {key_fingerprint(evicted_key)}: {e}")
+                # The async client is dropped; in-flight runs keep their own reference
+            return pair
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._clients),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+openai_client_pool = OpenAIClientPool()
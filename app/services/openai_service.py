@@ -1,30 +1,87 @@
-from openai import OpenAI
-import shelve
+from openai import OpenAI, AsyncOpenAI
+import asyncio
+import threading
 from dotenv import load_dotenv
 import os
 import time
 import logging
-import requests
+from urllib.parse import urlparse
 from app.utils.message_utils import save_assistant_reply
+from app.utils.media_buffer import MediaBuffer
+from app.utils.ttl_cache import TTLCache
+from app.services.run_manager import run_manager
+from app.services.thread_store import thread_store
+from app.services.thread_lifecycle import ThreadPolicy, thread_lifecycle_metrics, THREAD_SUMMARY_MODEL, THREAD_SUMMARY_MESSAGES
+from app.services.turn_metrics import turn_metrics
+from app.services.usage_meter import usage_meter
+from app.services.answer_cache import answer_cache
+from app.services.latency_budget import get_latency_budget, STILL_WORKING_MESSAGE, FALLBACK_REPLY
+from app.services.openai_client_pool import OpenAITenant, openai_client_pool
+from app.utils.client_registry import client_registry, ClientNotConfigured
 from flask import jsonify, request
 
-MAX_WAIT_SECONDS = 300  # 5 minutes
-POLL_INTERVAL = 2       # seconds between checks
+MAX_WAIT_SECONDS = 300  # 5 minutes, default when no latency budget is given
+POLL_INTERVAL = 2       # seconds between checks (polling mode only)
 MAX_RETRIES = 3
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENAI_ASSISTANT_ID = os.getenv('OPENAI_ASSISTANT_ID')
+# "async" multiplexes streamed runs on the run manager's event loop,
+# "stream" streams in the calling thread, "poll" keeps the legacy retrieve loop
+OPENAI_RUN_MODE = os.getenv('OPENAI_RUN_MODE', 'async')
+OPENAI_FILE_CACHE_TTL = int(os.getenv('OPENAI_FILE_CACHE_TTL', '86400'))
+OPENAI_FILE_CACHE_MAX_SIZE = int(os.getenv('OPENAI_FILE_CACHE_MAX_SIZE', '10000'))
 
-if not OPENAI_API_KEY or not OPENAI_ASSISTANT_ID:
-    raise EnvironmentError("Missing OPENAI_API_KEY or OPENAI_ASSISTANT_ID")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+def _create_openai_client(client_class):
+    if not OPENAI_API_KEY:
+        raise ClientNotConfigured("OPENAI_API_KEY is not set")
+    return client_class(api_key=OPENAI_API_KEY)
+
+
+client_registry.register("openai", lambda: _create_openai_client(OpenAI), probe=lambda c: c.models.list(timeout=10))
+client_registry.register("openai_async", lambda: _create_openai_client(AsyncOpenAI))
+# (api key fingerprint, sha256 of the bytes) -> OpenAI file id
+openai_file_cache = TTLCache("openai_files", maxsize=OPENAI_FILE_CACHE_MAX_SIZE, ttl=OPENAI_FILE_CACHE_TTL)
+
+
+def get_openai_client():
+    return client_registry.get("openai")
+
+
+def get_default_tenant(assistant_id=None):
+    """The environment's OpenAI key with `assistant_id` (default OPENAI_ASSISTANT_ID)."""
+    assistant_id = assistant_id or OPENAI_ASSISTANT_ID
+    if not assistant_id:
+        raise ClientNotConfigured("OPENAI_ASSISTANT_ID is not set")
+    return OpenAITenant(OPENAI_API_KEY, assistant_id, get_openai_client(), client_registry.get("openai_async"))
+
+
+def get_tenant(app=None):
+    """
+    Resolve the OpenAI account for an app (AppSnapshot). Apps with their own
+    openai_settings get a pooled client for their key and their own assistant;
+    everything else falls back to the environment's key and assistant.
+    A key without an assistant_id is ignored: assistants belong to the account
+    that created them, so it cannot be paired with OPENAI_ASSISTANT_ID.
+    """
+    settings = app.credentials()["openai"] if app else {}
+    api_key = settings.get("api_key")
+    assistant_id = settings.get("assistant_id")
+    if not api_key or api_key == OPENAI_API_KEY:
+        return get_default_tenant(assistant_id)
+    if not assistant_id:
+        logging.warning(f"[OpenAI] App {app.app_id} has an api_key but no assistant_id; using the default assistant")
+        return get_default_tenant()
+
+    tenant_client, tenant_async_client = openai_client_pool.get(api_key)
+    return OpenAITenant(api_key, assistant_id, tenant_client, tenant_async_client)
 
 
 def upload_file(path):
     # Upload a file with an "assistants" purpose
-    file = client.files.create(
+    file = get_openai_client().files.create(
         file=open("../../data/airbnb-faq.pdf", "rb"), purpose="assistants"
     )
 
@@ -33,7 +90,7 @@ def create_assistant(file):
     """
     You currently cannot set the temperature for Assistant via the API.
     """
-    assistant = client.beta.assistants.create(
+    assistant = get_openai_client().beta.assistants.create(
         name="WhatsApp AirBnb Assistant",
         instructions="You're a helpful WhatsApp assistant that can assist guests that are staying in our Paris AirBnb. Use your knowledge base to best respond to customer queries. If you don't know the answer, say simply that you cannot help with question and advice to contact the host directly. Be friendly and funny.",
         tools=[{"type": "retrieval"}],
@@ -43,128 +100,545 @@ def create_assistant(file):
     return assistant
 
 
-# Use context manager to ensure the shelf file is closed properly
-def check_if_thread_exists(wa_id):
-    with shelve.open("threads_db") as threads_shelf:
-        return threads_shelf.get(wa_id, None)
+def run_assistant_background(thread_id, name, callback=None, tenant=None, additional_messages=None, state=None, max_wait=MAX_WAIT_SECONDS, run_options=None):
+    """
+    Run the assistant on `thread_id` and hand the reply to `callback(thread_id, reply)`.
+    `additional_messages` are appended to the thread by the run itself; `run_options`
+    are extra runs.create parameters (see ThreadPolicy.run_options).
+    Returns the callback's result, or an error string if the run did not complete.
+    """
+    if OPENAI_RUN_MODE == "poll":
+        return poll_assistant_run(thread_id, name, callback, tenant=tenant, additional_messages=additional_messages, state=state, max_wait=max_wait, run_options=run_options)
+    return stream_assistant_run(thread_id, name, callback, tenant=tenant, additional_messages=additional_messages, state=state, max_wait=max_wait, run_options=run_options)
+
+
+def _cancel_run(thread_id, run_id, tenant=None, state=None):
+    tenant = tenant or get_default_tenant()
+    if state is not None:
+        state["round_trips"] += 1
+    try:
+        tenant.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception as cancel_err:
+        logging.warning(f"Could not cancel run: {cancel_err}")
+
+
+def _apply_run_event(event, state):
+    """
+    Fold one streamed run event into `state` ({"run_id", "deltas", "reply", "error", "usage", ...}).
+    Returns "completed", "failed" or "requires_action" for terminal events, else None.
+    """
+    kind = event.event
+    if kind == "thread.run.created":
+        state["run_id"] = event.data.id
+
+    elif kind == "thread.message.delta":
+        for part in event.data.delta.content or []:
+            if part.type == "text" and part.text and part.text.value:
+                state["deltas"].append(part.text.value)
+
+    elif kind == "thread.message.completed" and event.data.role == "assistant":
+        texts = [c.text.value for c in event.data.content if c.type == "text"]
+        if texts:
+            state["reply"] = "\n".join(texts)
+
+    elif kind == "thread.run.requires_action":
+        return "requires_action"
+
+    elif kind in ("thread.run.failed", "thread.run.cancelled", "thread.run.expired"):
+        _capture_usage(event.data, state)
+        error_info = getattr(event.data, "last_error", None)
+        state["error"] = getattr(error_info, "message", "Unknown error") if error_info else "No error details"
+        logging.warning(f"Run failed | status: {event.data.status} | reason: {state['error']}")
+        return "failed"
+
+    elif kind == "thread.run.completed":
+        _capture_usage(event.data, state)
+        return "completed"
+    return None
+
+
+def _capture_usage(run, state):
+    state["usage"] = getattr(run, "usage", None)
+    state["model"] = getattr(run, "model", None)
+
+
+def _new_run_state():
+    # round_trips counts the OpenAI HTTP calls made for one turn (see turn_metrics);
+    # delivered is set once the reply is handed to the callback (no fallback after that)
+    return {"run_id": None, "deltas": [], "reply": None, "error": None, "round_trips": 0, "usage": None, "model": None, "delivered": False}
+
+
+def _record_turn(state, start_time, tenant, app_id, mode=None):
+    duration = time.time() - start_time
+    turn_metrics.record(mode or OPENAI_RUN_MODE, state["round_trips"], duration)
+    usage_meter.record(
+        app_id, tenant.assistant_id, duration, state["round_trips"],
+        usage=state["usage"], model=state["model"],
+        failed=bool(state["error"]), cached=mode == "answer_cache"
+    )
+
+
+def _run_params(thread_id, tenant, additional_messages, run_options=None):
+    params = {"thread_id": thread_id, "assistant_id": tenant.assistant_id}
+    if additional_messages:
+        params["additional_messages"] = additional_messages
+    if run_options:
+        params.update(run_options)
+    return params
 
 
-def store_thread(wa_id, thread_id):
-    with shelve.open("threads_db", writeback=True) as threads_shelf:
-        threads_shelf[wa_id] = thread_id
+def stream_assistant_run(thread_id, name, callback=None, tenant=None, additional_messages=None, state=None, max_wait=MAX_WAIT_SECONDS, run_options=None):
+    """
+    Streaming run engine: the run is created with stream=True and the reply is
+    taken from the run events, so completion is observed as soon as it happens
+    and no runs.retrieve/messages.list calls are made.
+    """
+    tenant = tenant or get_default_tenant()
+    state = state if state is not None else _new_run_state()
+    start_time = time.time()
+    try:
+        state["round_trips"] += 1
+        stream = tenant.client.beta.threads.runs.create(
+            **_run_params(thread_id, tenant, additional_messages, run_options),
+            stream=True,
+            timeout=max_wait
+        )
+        outcome = None
+        try:
+            for event in stream:
+                outcome = _apply_run_event(event, state)
+                if outcome:
+                    break
+                if time.time() - start_time > max_wait:
+                    logging.error(f"Timeout hit. Cancelling run {state['run_id']}...")
+                    state["error"] = "timeout"
+                    if state["run_id"]:
+                        _cancel_run(thread_id, state["run_id"], tenant, state)
+                    return "Assistant timed out. Please try again."
+        finally:
+            stream.close()
+
+        if outcome == "requires_action":
+            # No function tools are wired up, so there is nothing we can submit
+            logging.warning(f"Run {state['run_id']} requires action; cancelling")
+            _cancel_run(thread_id, state["run_id"], tenant, state)
+            return "Assistant requested an unsupported action."
+        if outcome == "failed":
+            return f"Assistant failed: {state['error']}"
+
+        reply = state["reply"] or "".join(state["deltas"])
+        if reply:
+            logging.info(f"Assistant reply streamed in {time.time() - start_time:.2f}s.")
+            if callback:
+                state["delivered"] = True
+                return callback(thread_id, reply)
+            return reply
+
+        logging.warning("No assistant reply found in run events.")
+        return "No reply generated by the assistant."
+
+    except Exception as e:
+        logging.error(f"Exception in stream_assistant_run: {e}")
+        state["error"] = str(e)
+        return "An unexpected error occurred."
 
 
-def run_assistant_background(thread, name, callback=None):
+async def _async_cancel_run(thread_id, run_id, tenant=None, state=None):
+    tenant = tenant or get_default_tenant()
+    if state is not None:
+        state["round_trips"] += 1
     try:
-        # Step 1: Create a run for the thread
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=OPENAI_ASSISTANT_ID
+        await tenant.async_client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception as cancel_err:
+        logging.warning(f"Could not cancel run: {cancel_err}")
+
+
+async def stream_assistant_run_async(thread_id, name, callback=None, tenant=None, additional_messages=None, state=None, run_options=None):
+    """
+    Same contract as stream_assistant_run, but awaited on the run manager's
+    event loop. The blocking callback (Firestore write + platform send) runs in
+    a worker thread. On deadline cancellation the OpenAI run is cancelled too.
+    """
+    tenant = tenant or get_default_tenant()
+    state = state if state is not None else _new_run_state()
+    start_time = time.time()
+    try:
+        state["round_trips"] += 1
+        stream = await tenant.async_client.beta.threads.runs.create(
+            **_run_params(thread_id, tenant, additional_messages, run_options),
+            stream=True
         )
+        outcome = None
+        try:
+            async for event in stream:
+                outcome = _apply_run_event(event, state)
+                if outcome:
+                    break
+        finally:
+            await stream.close()
+    except asyncio.CancelledError:
+        logging.error(f"Deadline hit. Cancelling run {state['run_id']}...")
+        state["error"] = "deadline exceeded"
+        if state["run_id"]:
+            await _async_cancel_run(thread_id, state["run_id"], tenant, state)
+        raise
+    except Exception as e:
+        logging.error(f"Exception in stream_assistant_run_async: {e}")
+        state["error"] = str(e)
+        return "An unexpected error occurred."
+
+    if outcome == "requires_action":
+        logging.warning(f"Run {state['run_id']} requires action; cancelling")
+        await _async_cancel_run(thread_id, state["run_id"], tenant, state)
+        return "Assistant requested an unsupported action."
+    if outcome == "failed":
+        return f"Assistant failed: {state['error']}"
+
+    reply = state["reply"] or "".join(state["deltas"])
+    if not reply:
+        logging.warning("No assistant reply found in run events.")
+        return "No reply generated by the assistant."
+
+    logging.info(f"Assistant reply streamed in {time.time() - start_time:.2f}s.")
+    if callback:
+        # A deadline that cancels us from here on must not also send the fallback:
+        # the worker thread keeps running and delivers this reply
+        state["delivered"] = True
+        return await asyncio.to_thread(callback, thread_id, reply)
+    return reply
+
+
+def poll_assistant_run(thread_id, name, callback=None, tenant=None, additional_messages=None, state=None, max_wait=MAX_WAIT_SECONDS, run_options=None):
+    tenant = tenant or get_default_tenant()
+    state = state if state is not None else _new_run_state()
+    try:
+        # Step 1: Create a run for the thread (with the turn's user messages attached)
+        state["round_trips"] += 1
+        run = tenant.client.beta.threads.runs.create(**_run_params(thread_id, tenant, additional_messages, run_options))
         run_id = run.id
         start_time = time.time()
-        logging.info(f"Started assistant run {run_id} for thread {thread.id}")
+        logging.info(f"Started assistant run {run_id} for thread {thread_id}")
 
         # Step 2: Poll until completed or timeout
-        while run.status != "completed" and time.time() - start_time < MAX_WAIT_SECONDS:
+        while run.status != "completed" and time.time() - start_time < max_wait:
             time.sleep(POLL_INTERVAL)
-            run = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
+            state["round_trips"] += 1
+            run = tenant.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
             logging.info(f"Polling run {run.id}: status = {run.status}")
 
             if run.status in ["failed", "cancelled", "expired"]:
+                _capture_usage(run, state)
                 error_info = getattr(run, "last_error", None)
                 error_message = getattr(error_info, "message", "Unknown error") if error_info else "No error details"
+                state["error"] = error_message
                 logging.warning(f"Run failed | status: {run.status} | reason: {error_message}")
                 return f"Assistant failed: {error_message}"
 
         # Step 3: Cancel if timeout hit
         if run.status != "completed":
             logging.error(f"Timeout hit. Cancelling run {run.id}...")
-            try:
-                client.beta.threads.runs.cancel(thread_id=thread.id, run_id=run.id)
-            except Exception as cancel_err:
-                logging.warning(f"Could not cancel run: {cancel_err}")
+            state["error"] = "timeout"
+            _cancel_run(thread_id, run.id, tenant, state)
             return "Assistant timed out. Please try again."
 
-        # Step 4: Retrieve final message
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
+        _capture_usage(run, state)
+
+        # Step 4: Retrieve only the newest message produced by this run
+        state["round_trips"] += 1
+        messages = tenant.client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id, order="desc", limit=1)
         for message in messages.data:
             if message.role == "assistant":
                 for content in message.content:
                     if content.type == "text":
                         logging.info("Assistant reply retrieved successfully.")
                         if callback:
-                            return callback(thread.id, content.text.value)
+                            state["delivered"] = True
+                            return callback(thread_id, content.text.value)
+                        return content.text.value
 
         logging.warning("No assistant reply found in message list.")
         return "No reply generated by the assistant."
 
     except Exception as e:
         logging.error(f"Exception in run_assistant: {e}")
+        state["error"] = str(e)
         return "An unexpected error occurred."
 
 
-def generate_response(message_body, wa_id, name, image_path=None, file_path=None):
-    # Check if there is already a thread_id for the wa_id
-    thread_id = check_if_thread_exists(wa_id)
-    file_id = None
+def get_or_create_thread_id(wa_id, name, tenant=None, app_id=None, policy=None):
+    """
+    Return the OpenAI thread id mapped to this chat, creating the thread on first contact.
 
-    # If a thread doesn't exist, create one and store it
-    if thread_id is None:
+    With a ThreadPolicy, a chat that is due for rotation is moved to a new thread
+    first (see _maybe_rotate_thread), so the senders save the inbound message
+    under the same thread the turn will run on.
+    """
+    tenant = tenant or get_default_tenant()
+
+    def create_thread():
         logging.info(f"Creating new thread for {name} with wa_id {wa_id}")
-        thread = client.beta.threads.create()
-        store_thread(wa_id, thread.id)
-        thread_id = thread.id
+        return tenant.client.beta.threads.create().id
+
+    thread_id = thread_store.get_or_create(app_id, wa_id, create_thread)
+    if policy and policy.rotation_enabled:
+        thread_id = _maybe_rotate_thread(wa_id, thread_id, tenant, app_id, policy)
+    return thread_id
+
+
+def run_assistant_turn(messages, wa_id, name, callback=None, app=None, app_id=None, notify=None):
+    """
+    Answer the user message(s) of one turn with a single assistant run.
+
+    `messages` is a list of {"message_body", "image_path", "file_path"} dicts; a
+    debounced burst arrives here as several items answered by a single run.
+    They are attached to the run via additional_messages, so a text turn costs
+    one OpenAI round trip in streaming modes.
+    Must run serialized per chat (see chat_executor) so runs never overlap on a thread.
+    `app` (AppSnapshot) selects the tenant's OpenAI key and assistant; `app_id`
+    scopes the chat's thread mapping.
+
+    The turn runs under the latency budget of the app's plan: `notify(text)`
+    sends the user a "still working" message after the soft deadline and a
+    fallback reply when the hard deadline cancels the run.
+
+    Long-lived chats are moved to a fresh thread by the sender according to the
+    app's ThreadPolicy (see get_or_create_thread_id); the first turn on the new
+    thread carries a summary of the old one (see _prepare_turn).
+    """
+    tenant = get_tenant(app)
+    policy = ThreadPolicy.for_app(app)
+    app_id = app_id or (app.app_id if app else None)
+
+    answer_key = answer_cache.key_for(app, tenant.assistant_id, messages)
+    if answer_key and not _thread_is_fresh(app_id, wa_id):
+        # The reply may depend on what was said before; only context-free turns are cached
+        answer_key = None
+    if answer_key:
+        start_time = time.time()
+        answer = answer_cache.get(answer_key, app)
+        if answer is not None:
+            # Served without a run, so the exchange is not added to the OpenAI thread
+            logging.info(f"[AnswerCache] Answering {wa_id} from cache")
+            thread_id = get_or_create_thread_id(wa_id, name, tenant, app_id)
+            try:
+                return callback(thread_id, answer) if callback else answer
+            finally:
+                _record_turn(_new_run_state(), start_time, tenant, app_id, mode="answer_cache")
+        callback = _caching_callback(answer_key, app, callback)
+
+    budget = get_latency_budget(app)
+    state = _new_run_state()
+    on_soft_deadline = on_timeout = None
+    if notify:
+        still_working = (app.get("still_working_message") if app else None) or STILL_WORKING_MESSAGE
+        fallback = (app.get("fallback_reply") if app else None) or FALLBACK_REPLY
+        on_soft_deadline = lambda: None if state["delivered"] else notify(still_working)
+        on_timeout = lambda: None if state["delivered"] else notify(fallback)
+
+    if OPENAI_RUN_MODE == "async":
+        # Returns a Future; chat_executor resumes the chat's queue when it resolves
+        return run_manager.submit(
+            lambda: _run_assistant_turn_async(messages, wa_id, name, callback, tenant, app_id, policy, state),
+            deadline=budget.hard_seconds,
+            label=wa_id,
+            priority=budget.priority,
+            soft_deadline=budget.soft_seconds,
+            on_soft_deadline=on_soft_deadline,
+            on_timeout=on_timeout
+        )
+
+    start_time = time.time()
+    soft_timer = None
+    if on_soft_deadline:
+        soft_timer = threading.Timer(budget.soft_seconds, on_soft_deadline)
+        soft_timer.daemon = True
+        soft_timer.start()
+    try:
+        thread_id, additional_messages = _prepare_turn(messages, wa_id, name, tenant, app_id, state, policy)
+        result = run_assistant_background(
+            thread_id, name, callback, tenant, additional_messages, state,
+            max_wait=budget.hard_seconds, run_options=policy.run_options()
+        )
+        if state["error"] == "timeout" and on_timeout:
+            on_timeout()
+        _finish_thread_turn(state, app_id, wa_id)
+        return result
+    finally:
+        if soft_timer:
+            soft_timer.cancel()
+        _record_turn(state, start_time, tenant, app_id)
+
+
+async def _run_assistant_turn_async(messages, wa_id, name, callback=None, tenant=None, app_id=None, policy=None, state=None):
+    policy = policy or ThreadPolicy()
+    state = state if state is not None else _new_run_state()
+    start_time = time.time()
+    try:
+        thread_id, additional_messages = await asyncio.to_thread(_prepare_turn, messages, wa_id, name, tenant, app_id, state, policy)
+        result = await stream_assistant_run_async(thread_id, name, callback, tenant, additional_messages, state, policy.run_options())
+        await asyncio.to_thread(_finish_thread_turn, state, app_id, wa_id)
+        return result
+    finally:
+        _record_turn(state, start_time, tenant, app_id)
+
+
+def _thread_is_fresh(app_id, wa_id):
+    # No turns have run on the chat's thread, and it is not seeded with a summary of an older one
+    record = thread_store.get_record(app_id, wa_id)
+    if record and (record.get("turns") or record.get("generation")):
+        return False
+    # Another worker may have run the first turn since this one cached the record
+    record = thread_store.get_record(app_id, wa_id, refresh=True)
+    return record is None or (not record.get("turns") and not record.get("generation"))
+
+
+def _caching_callback(answer_key, app, callback):
+    # Only successful replies reach the callback, so errors are never cached
+    def cache_and_reply(thread_id, reply):
+        answer_cache.set(answer_key, reply, app)
+        return callback(thread_id, reply) if callback else reply
+    return cache_and_reply
+
+
+def _prepare_turn(messages, wa_id, name, tenant, app_id, state, policy=None):
+    # The sender already created (or rotated) the thread, so this is a thread_store cache hit
+    thread_id = get_or_create_thread_id(wa_id, name, tenant, app_id)
+    state["thread_id"] = thread_id
+    additional_messages = [build_user_message(tenant=tenant, state=state, **message) for message in messages]
+
+    record = thread_store.get_record(app_id, wa_id)
+    if record and record["thread_id"] == thread_id and record.get("generation") and not record.get("turns"):
+        # First turn on a rotated thread: carry the old thread over as a summary
+        state["first_after_rotation"] = True
+        summary = None
+        if record.get("previous_thread_id"):
+            try:
+                summary = _summarize_thread(record["previous_thread_id"], tenant, state)
+            except Exception as e:
+                logging.warning(f"[ThreadRotation] Could not summarize {record['previous_thread_id']} for {wa_id}: {e}")
+                thread_lifecycle_metrics.rotation_failed()
+        if summary:
+            state["seeded"] = True
+            additional_messages.insert(0, {"role": "assistant", "content": f"Summary of our conversation so far:\n{summary}"})
+    return thread_id, additional_messages
+
+
+def _maybe_rotate_thread(wa_id, thread_id, tenant, app_id, policy):
+    """
+    Move the chat to a new, empty thread when the policy says its thread has
+    grown too long or gone idle; the next turn seeds it with a summary of the
+    old one. Checked against the cached mapping, so a chat that is not due
+    costs no backend read. Returns the thread id to use; the old thread is
+    kept if anything fails.
+    """
+    record = thread_store.get_record(app_id, wa_id)
+    if not record or record["thread_id"] != thread_id:
+        return record["thread_id"] if record else thread_id
+
+    reason = policy.rotation_reason(record)
+    if not reason:
+        return thread_id
+
+    try:
+        new_thread_id = tenant.client.beta.threads.create().id
+    except Exception as e:
+        logging.warning(f"[ThreadRotation] Could not rotate thread {thread_id} for {wa_id}, keeping it: {e}")
+        thread_lifecycle_metrics.rotation_failed()
+        return thread_id
+
+    current = thread_store.rotate(app_id, wa_id, new_thread_id, thread_id)
+    if current == new_thread_id:
+        logging.info(f"[ThreadRotation] {wa_id} moved from {thread_id} to {new_thread_id} ({reason}, generation {record.get('generation', 0) + 1})")
+        thread_lifecycle_metrics.rotated(reason, record)
+    return current
+
+
+def _summarize_thread(thread_id, tenant, state):
+    # Summary tokens go through chat.completions and are not part of the run's usage
+    state["round_trips"] += 1
+    messages = tenant.client.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=THREAD_SUMMARY_MESSAGES)
+    lines = []
+    for message in reversed(messages.data):
+        text = " ".join(c.text.value for c in message.content if c.type == "text")
+        if text:
+            lines.append(f"{message.role}: {text}")
+    if not lines:
+        return None
+
+    state["round_trips"] += 1
+    completion = tenant.client.chat.completions.create(
+        model=THREAD_SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": "Summarize this conversation between a user and an assistant in a few short bullet points. Keep names, facts, open questions and anything the user asked to remember."},
+            {"role": "user", "content": "\n".join(lines)}
+        ],
+        max_tokens=400
+    )
+    return completion.choices[0].message.content
+
+
+def _finish_thread_turn(state, app_id, wa_id):
+    # Count the turn on the chat's thread so the policy can decide when to rotate it.
+    # A failed run whose summary seed already reached the thread counts too, so it is not seeded twice.
+    if not state.get("thread_id"):
+        return
+    if state["error"] and not (state.get("seeded") and state["run_id"]):
+        return
+    prompt_tokens = getattr(state["usage"], "prompt_tokens", 0) or 0
+    thread_lifecycle_metrics.turn(prompt_tokens, state.get("first_after_rotation", False))
+    try:
+        thread_store.record_turn(app_id, wa_id, prompt_tokens)
+    except Exception as e:
+        logging.warning(f"[ThreadRotation] Could not record turn for {wa_id}: {e}")
+
+
+def build_user_message(message_body, image_path=None, file_path=None, file=None, tenant=None, state=None):
+    """
+    Build one additional_messages entry for a run. Documents are uploaded to
+    OpenAI first and attached to the message: straight from `file` (the
+    MediaBuffer the sender downloaded) when given, else from `file_path`.
+    The buffer is closed once uploaded.
+    """
+    tenant = tenant or get_default_tenant()
+    file_id = None
 
-    # Otherwise, retrieve the existing thread
-    else:
-        logging.info(f"Retrieving existing thread for {name} with wa_id {wa_id}")
-        thread = client.beta.threads.retrieve(thread_id)
-        
     logging.info(f"Retrieving image path {image_path} with file_path {file_path}")
-    # Step 2: Prepare message content
     if image_path:
-        
         message_content = [
             {"type": "text", "text": message_body or "Please describe this image."},
             {"type": "image_url", "image_url": {"url": image_path}}
         ]
-    elif file_path:
+    elif file_path or file:
         message_content = [
             {"type": "text", "text": message_body or "Please describe this document."},
         ]
-        
+
         logging.info(f"file path for open ai: {file_path}")
-        response = requests.get(file_path)
-        response.raise_for_status()
-        
-        # Save temp file
-        with open("temp.pdf", "wb") as f:
-            f.write(response.content)
-        
-        with open("temp.pdf", "rb") as f:
-            file = client.files.create(file=f, purpose="assistants")
-            file_id = file.id
+        media = file or MediaBuffer.download(file_path, filename=os.path.basename(urlparse(file_path).path) or "document")
+        with media:
+            # Customers resend the same documents; reuse the file already uploaded to this account
+            cache_key = (tenant.key_id, media.sha256)
+            file_id = openai_file_cache.get(cache_key)
+            if file_id is None:
+                if state is not None:
+                    state["round_trips"] += 1
+                file_id = tenant.client.files.create(file=media.as_upload(), purpose="assistants").id
+                openai_file_cache.set(cache_key, file_id)
+            else:
+                logging.info(f"[OpenAI] Reusing uploaded file {file_id} for {media.filename}")
     else:
         message_content = message_body
-        
-    # Add message to thread
-    message_params = {
-        "thread_id": thread_id,
-        "role": "user",
-        "content": message_content,
-    }
+
+    message = {"role": "user", "content": message_content}
     if file_id:
-        message_params["attachments"] = [{"file_id": file_id, "tools": [{"type": "file_search"}, {"type": "code_interpreter"}]}]
-        
-    logging.info(f"[OpenAI] Sending message with params: {message_params}")
-    message = client.beta.threads.messages.create(**message_params)
-    # Run the assistant and get the new message
-    return thread, name
+        message["attachments"] = [{"file_id": file_id, "tools": [{"type": "file_search"}, {"type": "code_interpreter"}]}]
+
+    logging.info(f"[OpenAI] Attaching message to run: {message}")
+    return message
 
 def list_assistant():
     try:
-        assistants = client.beta.assistants.list().data
+        assistants = get_openai_client().beta.assistants.list().data
         assistant_list = [a.model_dump() for a in assistants]
         return jsonify(assistant_list), 200
     except Exception as err:
@@ -183,7 +657,7 @@ def create_assistant():
 
     try:
         # Create an assistant
-        assistant = client.beta.assistants.create(
+        assistant = get_openai_client().beta.assistants.create(
             **{k: v for k, v in data.items() if k in allowed_keys}
         )
             
@@ -198,7 +672,8 @@ def delete_assistant(assistant_id):
     try:
         if assistant_id:
             # Delete the assistant
-            assistant = client.beta.assistants.delete(assistant_id)
+            assistant = get_openai_client().beta.assistants.delete(assistant_id)
+            answer_cache.invalidate(assistant_id)
             
             logging.info(f"Assistant deleted ID: {assistant.id}")
             return jsonify({"status": "success", "message": f"Assistant deleted ID: {assistant.id}"}), 200
@@ -225,11 +700,12 @@ def update_assistant(assistant_id):
         
     # Update an assistant
     try:
-        assistant = client.beta.assistants.update(
+        assistant = get_openai_client().beta.assistants.update(
                 assistant_id=assistant_id,
                 **{k: v for k, v in data.items() if k in allowed_keys}
         )
                 
+        answer_cache.invalidate(assistant_id)
         logging.info(f"Assistant updated ID: {assistant.id}")
         return jsonify({"status": "success", "message": f"Assistant updated ID: {assistant.id}"}), 200
     except Exception as err:
@@ -250,7 +726,7 @@ def cancel_run_assistant():
         return jsonify({"error": "thread_id and run_id are required"}), 400
 
     try:
-        result = client.beta.threads.runs.cancel(
+        result = get_openai_client().beta.threads.runs.cancel(
             thread_id=thread_id,
             run_id=run_id
         )
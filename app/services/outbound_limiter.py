@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+# Platform limits per worker process; divide by the number of workers sending for the same account
+TELEGRAM_BOT_RATE = float(os.getenv("TELEGRAM_BOT_RATE", "30"))                        # msgs/s per bot
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))                       # msgs/s per private chat
+TELEGRAM_GROUP_RATE_PER_MINUTE = float(os.getenv("TELEGRAM_GROUP_RATE_PER_MINUTE", "20"))
+WHATSAPP_PHONE_RATE = float(os.getenv("WHATSAPP_PHONE_RATE", "80"))                    # msgs/s per phone number (messaging tier)
+WHATSAPP_PAIR_RATE = 1 / 6       # same business number -> same user
+WHATSAPP_PAIR_BURST = 10
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "60"))   # longer back-offs fail the send instead
+MAX_BUCKETS = 100000
+
+# Graph API error codes that mean "slow down", by the scope they apply to
+WHATSAPP_THROTTLE_CODES = {130429: "phone", 80007: "phone", 4: "phone", 613: "phone", 131056: "pair"}
+
+Limit = namedtuple("Limit", ["key", "rate", "burst"])
+
+
+class TokenBucket:
+    """
+    Token bucket kept as a theoretical arrival time (GCRA). `reserve()` always
+    takes a token and returns how long to wait before using it, so callers
+    queue behind each other instead of being rejected.
+    """
+
+    __slots__ = ("interval", "burst", "_tat", "_paused_until", "_lock")
+
+    def __init__(self, rate, burst=1):
+        self.interval = 1 / rate
+        self.burst = max(1, burst)
+        self._tat = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, now):
+        with self._lock:
+            tat = max(self._tat, now)
+            self._tat = tat + self.interval
+            allowed_at = self._tat - self.burst * self.interval
+            return max(0.0, allowed_at - now, self._paused_until - now)
+
+    def pause(self, seconds, now):
+        with self._lock:
+            until = now + seconds
+            self._paused_until = max(self._paused_until, until)
+            self._tat = max(self._tat, until)
+
+
+class OutboundLimiter:
+    """
+    Paces outbound sends per platform account (bot, phone number) and per chat.
+
+    Senders describe their limits as Limit(key, rate, burst) tuples; a send
+    waits for the slowest of its buckets. When the platform still answers
+    with a rate-limit error, the matching bucket is paused for the advertised
+    (or a backed-off) time and the send is retried, so throttled messages are
+    delayed rather than dropped.
+    """
+
+    def __init__(self, max_buckets=MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+        # metrics
+        self.reservations_total = 0
+        self.delayed_total = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self.throttled = Counter()
+        self.gave_up_total = 0
+
+    def _bucket(self, limit):
+        with self._lock:
+            bucket = self._buckets.get(limit.key)
+            if bucket is None:
+                bucket = self._buckets[limit.key] = TokenBucket(limit.rate, limit.burst)
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(limit.key)
+            return bucket
+
+    def reserve(self, limits):
+        """Take a token from every bucket of `limits`; returns the seconds to wait before sending."""
+        now = time.monotonic()
+        wait = max((self._bucket(limit).reserve(now) for limit in limits), default=0.0)
+        with self._lock:
+            self.reservations_total += 1
+            if wait:
+                self.delayed_total += 1
+                self.wait_seconds_total += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        return wait
+
+    def throttled_by_platform(self, limit, seconds, scope):
+        """Pause `limit`'s bucket after a rate-limit response. Returns False when the wait is too long to retry."""
+        with self._lock:
+            self.throttled[scope] += 1
+            if seconds > RATE_LIMIT_MAX_WAIT:
+                self.gave_up_total += 1
+                return False
+        logging.warning(f"[OutboundLimiter] {scope} throttled ({limit.key}); pausing {seconds:.1f}s")
+        self._bucket(limit).pause(seconds, time.monotonic())
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buckets": len(self._buckets),
+                "reservations_total": self.reservations_total,
+                "delayed_total": self.delayed_total,
+                "avg_wait_seconds": round(self.wait_seconds_total / self.delayed_total, 3) if self.delayed_total else None,
+                "max_wait_seconds": round(self.max_wait_seconds, 3),
+                "throttled_by_platform": dict(self.throttled),
+                "gave_up_total": self.gave_up_total,
+            }
+
+
+outbound_limiter = OutboundLimiter()
+
+
+def _json(body):
+    try:
+        return json.loads(body) if body else {}
+    except ValueError:
+        return {}
+
+
+def _backoff(base, attempt):
+    return base * (2 ** attempt)
+
+
+def telegram_limits(bot_id, chat_id):
+    chat = str(chat_id)
+    if chat.startswith("-"):
+        # Groups, supergroups and channels
+        chat_limit = Limit(f"tg:{bot_id}:{chat}", TELEGRAM_GROUP_RATE_PER_MINUTE / 60, 3)
+    else:
+        chat_limit = Limit(f"tg:{bot_id}:{chat}", TELEGRAM_CHAT_RATE, 1)
+    return [Limit(f"tg:{bot_id}", TELEGRAM_BOT_RATE, TELEGRAM_BOT_RATE), chat_limit]
+
+
+def telegram_throttle(bot_id, chat_id, status, headers, body, attempt):
+    """(limit, seconds, scope) to back off for a Telegram 429, else None."""
+    if status != 429:
+        return None
+    retry_after = (_json(body).get("parameters") or {}).get("retry_after") or headers.get("Retry-After")
+    seconds = float(retry_after) if retry_after else _backoff(1, attempt)
+    # Per-chat pacing is already enforced locally, so a 429 means the bot as a whole is over its limit
+    return telegram_limits(bot_id, chat_id)[0], seconds, "telegram_bot"
+
+
+def whatsapp_limits(phone_number_id, recipient_id, phone_rate=None):
+    phone_rate = phone_rate or WHATSAPP_PHONE_RATE
+    return [
+        Limit(f"wa:{phone_number_id}", phone_rate, phone_rate),
+        Limit(f"wa:{phone_number_id}:{recipient_id}", WHATSAPP_PAIR_RATE, WHATSAPP_PAIR_BURST),
+    ]
+
+
+def whatsapp_throttle(phone_number_id, recipient_id, status, headers, body, attempt, phone_rate=None):
+    """(limit, seconds, scope) to back off for a Graph API throttling error, else None."""
+    if status < 400:
+        return None
+    code = (_json(body).get("error") or {}).get("code")
+    scope = WHATSAPP_THROTTLE_CODES.get(code)
+    if scope is None and status == 429:
+        scope = "phone"
+    if scope is None:
+        return None
+
+    phone_limit, pair_limit = whatsapp_limits(phone_number_id, recipient_id, phone_rate)
+    retry_after = headers.get("Retry-After")
+    if scope == "pair":
+        return pair_limit, float(retry_after) if retry_after else _backoff(1 / WHATSAPP_PAIR_RATE, attempt), "whatsapp_pair"
+    return phone_limit, float(retry_after) if retry_after else _backoff(1, attempt), "whatsapp_phone"
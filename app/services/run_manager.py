@@ -0,0 +1,188 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+from collections import deque
+
+RUN_MANAGER_MAX_CONCURRENCY = int(os.getenv("RUN_MANAGER_MAX_CONCURRENCY", "200"))
+RUN_MANAGER_DEFAULT_DEADLINE = float(os.getenv("RUN_MANAGER_DEFAULT_DEADLINE", "300"))
+METRICS_WINDOW = 1000
+
+
+class AsyncRunManager:
+    """
+    Multiplexes in-flight assistant runs on one asyncio event loop.
+
+    The loop lives in a dedicated daemon thread (one per process, started on
+    first use). `submit()` schedules a coroutine under a global concurrency
+    limit and a per-run deadline and returns a concurrent.futures.Future, so
+    synchronous code can wait on it or chain a done-callback instead of
+    parking an OS thread for the whole run. When every slot is taken, waiting
+    runs are admitted by priority (highest first), then in submission order.
+    """
+
+    def __init__(self, max_concurrency=RUN_MANAGER_MAX_CONCURRENCY, default_deadline=RUN_MANAGER_DEFAULT_DEADLINE):
+        self.max_concurrency = max_concurrency
+        self.default_deadline = default_deadline
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+        self._active = 0
+        self._waiters = []   # heap of (-priority, seq, future), only touched on the loop thread
+        self._seq = itertools.count()
+
+        # metrics
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed_total = 0
+        self.failed_total = 0
+        self.timed_out_total = 0
+        self.expired_in_queue_total = 0
+        self.soft_deadline_total = 0
+        self._durations = deque(maxlen=METRICS_WINDOW)
+
+    def _ensure_loop(self):
+        # Event loop threads do not survive fork, so start one per process
+        if self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                self._active = 0
+                self._waiters = []
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run_loop, name="assistant-run-loop", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+            self._pid = os.getpid()
+            logging.info(f"[RunManager] Event loop started (max concurrency {self.max_concurrency})")
+            return loop
+
+    def submit(self, coro_factory, deadline=None, label=None, priority=0, soft_deadline=None, on_soft_deadline=None, on_timeout=None):
+        """
+        Schedule `coro_factory()` on the run loop.
+
+        Deadlines are measured from submission, so time spent waiting for a
+        slot counts against them. After `soft_deadline` seconds the blocking
+        `on_soft_deadline()` is called (e.g. to send a "still working" message);
+        at `deadline` the coroutine is cancelled (CancelledError is raised
+        inside it), or never started if it is still queued, and `on_timeout()`
+        is called. Both callbacks run in the loop's default thread pool.
+        """
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(
+            self._run(coro_factory, deadline or self.default_deadline, label, priority, soft_deadline, on_soft_deadline, on_timeout),
+            loop
+        )
+
+    async def _acquire(self, priority):
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release()
+            raise
+
+    def _release(self):
+        # Hand the slot straight to the best waiter, skipping ones that gave up
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def _notify(self, callback, label, kind):
+        if callback is None:
+            return
+
+        def run():
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"[RunManager] {kind} callback for {label or ''} failed: {e}")
+
+        asyncio.get_running_loop().run_in_executor(None, run)
+
+    def _on_soft_deadline(self, callback, label):
+        self.soft_deadline_total += 1
+        self._notify(callback, label, "Soft deadline")
+
+    async def _run(self, coro_factory, deadline, label, priority, soft_deadline, on_soft_deadline, on_timeout):
+        loop = asyncio.get_running_loop()
+        submitted = loop.time()
+        soft_handle = None
+        if soft_deadline and on_soft_deadline and soft_deadline < deadline:
+            soft_handle = loop.call_later(soft_deadline, self._on_soft_deadline, on_soft_deadline, label)
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._acquire(priority), timeout=deadline)
+            except asyncio.TimeoutError:
+                self.expired_in_queue_total += 1
+                logging.error(f"[RunManager] Run {label or ''} waited past its {deadline}s deadline; dropping it")
+                self._notify(on_timeout, label, "Timeout")
+                raise
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+            start = loop.time()
+            try:
+                result = await asyncio.wait_for(coro_factory(), timeout=deadline - (start - submitted))
+                self.completed_total += 1
+                return result
+            except asyncio.TimeoutError:
+                self.timed_out_total += 1
+                logging.error(f"[RunManager] Run {label or ''} exceeded its {deadline}s deadline")
+                self._notify(on_timeout, label, "Timeout")
+                raise
+            except Exception as e:
+                self.failed_total += 1
+                logging.error(f"[RunManager] Run {label or ''} failed: {e}")
+                raise
+            finally:
+                self.in_flight -= 1
+                self._release()
+                self._durations.append(loop.time() - start)
+        finally:
+            if soft_handle:
+                soft_handle.cancel()
+
+    def stats(self):
+        durations = sorted(self._durations)
+
+        def percentile(p):
+            if not durations:
+                return None
+            return round(durations[min(len(durations) - 1, int(len(durations) * p))], 3)
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed_total": self.completed_total,
+            "failed_total": self.failed_total,
+            "timed_out_total": self.timed_out_total,
+            "expired_in_queue_total": self.expired_in_queue_total,
+            "soft_deadline_total": self.soft_deadline_total,
+            "duration_seconds": {"p50": percentile(0.5), "p95": percentile(0.95), "max": round(durations[-1], 3) if durations else None},
+        }
+
+
+run_manager = AsyncRunManager()
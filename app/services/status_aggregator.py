@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from app.db.app_dao import get_app_by_waba_phone_id
+from app.db.delivery_status_dao import save_delivery_updates, STATUS_RANK
+from app.utils.webhook_envelope import WebhookEnvelope
+
+STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "5"))     # seconds
+STATUS_MAX_PENDING = int(os.getenv("STATUS_MAX_PENDING", "2000"))          # force a flush above this
+
+
+class StatusAggregator:
+    """
+    Coalesces WhatsApp delivery/read statuses before they reach Firestore.
+
+    Statuses are buffered per message id for STATUS_FLUSH_INTERVAL seconds, so
+    sent -> delivered -> read arriving close together becomes a single document
+    write. Per-app daily counters are accumulated in memory and flushed as
+    Increment transforms in the same batched write.
+    """
+
+    def __init__(self, flush_interval=STATUS_FLUSH_INTERVAL, max_pending=STATUS_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_now = threading.Event()
+        self._pending = {}    # wamid -> state
+        self._counters = {}   # (phone_number_id, date) -> {status: count}
+        self._pid = None
+
+        # metrics
+        self._received_total = 0
+        self._coalesced_total = 0
+        self._writes_total = 0
+        self._flush_failures = 0
+
+    def add_from_webhook(self, body):
+        """Buffer every status of a webhook payload. Returns the number of statuses parsed."""
+        envelope = body if isinstance(body, WebhookEnvelope) else WebhookEnvelope(body)
+        for phone_number_id, status in envelope.statuses:
+            self.add(phone_number_id, status)
+        return len(envelope.statuses)
+
+    def add(self, phone_number_id, status):
+        message_id = status.get("id")
+        new_status = status.get("status")
+        if not message_id or new_status not in STATUS_RANK:
+            return
+
+        timestamp = status.get("timestamp")
+        try:
+            date = datetime.fromtimestamp(int(timestamp), timezone.utc).strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+        self._ensure_flusher()
+        with self._lock:
+            self._received_total += 1
+            state = self._pending.get(message_id)
+            if state is None:
+                state = {
+                    "phone_number_id": phone_number_id,
+                    "recipient_id": status.get("recipient_id"),
+                    "status": new_status,
+                    "timestamps": {},
+                }
+                self._pending[message_id] = state
+            else:
+                self._coalesced_total += 1
+                if STATUS_RANK[new_status] > STATUS_RANK[state["status"]]:
+                    state["status"] = new_status
+
+            # A redelivered status inside the window is only counted once
+            if new_status not in state["timestamps"]:
+                counts = self._counters.setdefault((phone_number_id, date), {})
+                counts[new_status] = counts.get(new_status, 0) + 1
+            state["timestamps"][new_status] = timestamp
+
+            if new_status == "failed" and status.get("errors"):
+                state["errors"] = status["errors"]
+            if status.get("pricing"):
+                state["pricing"] = status["pricing"]
+
+            if len(self._pending) >= self.max_pending:
+                self._flush_now.set()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of documents written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                counters, self._counters = self._counters, {}
+            if not pending and not counters:
+                return 0
+
+            try:
+                app_ids = {}
+                for phone_number_id in {s["phone_number_id"] for s in pending.values()} | {k[0] for k in counters}:
+                    app = get_app_by_waba_phone_id(phone_number_id) if phone_number_id else None
+                    app_ids[phone_number_id] = app.get("app_id") if app else None
+
+                states = {}
+                for message_id, state in pending.items():
+                    states[message_id] = {**state, "app_id": app_ids.get(state["phone_number_id"])}
+
+                app_counters = {}
+                for (phone_number_id, date), counts in counters.items():
+                    app_id = app_ids.get(phone_number_id)
+                    if not app_id:
+                        continue
+                    merged = app_counters.setdefault((app_id, date), {})
+                    for status, n in counts.items():
+                        merged[status] = merged.get(status, 0) + n
+
+                written = save_delivery_updates(states, app_counters)
+            except Exception as e:
+                logging.error(f"[StatusAggregator] Failed to flush {len(pending)} statuses: {e}")
+                # Keep the statuses and counters for the next attempt instead of losing them
+                with self._lock:
+                    self._flush_failures += 1
+                    self._restore(pending, counters)
+                return 0
+
+            with self._lock:
+                self._writes_total += written
+            logging.info(f"[StatusAggregator] Flushed {len(states)} message states, {len(app_counters)} counters")
+            return written
+
+    def _restore(self, pending, counters):
+        # Merge a failed flush back under statuses that arrived meanwhile (caller holds _lock)
+        for message_id, state in pending.items():
+            current = self._pending.get(message_id)
+            if current is None:
+                self._pending[message_id] = state
+                continue
+            if STATUS_RANK[state["status"]] > STATUS_RANK[current["status"]]:
+                current["status"] = state["status"]
+            current["timestamps"] = {**state["timestamps"], **current["timestamps"]}
+            for key in ("errors", "pricing"):
+                if key in state and key not in current:
+                    current[key] = state[key]
+        for key, counts in counters.items():
+            merged = self._counters.setdefault(key, {})
+            for status, n in counts.items():
+                merged[status] = merged.get(status, 0) + n
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork, so start one per process on first use
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name="status-flusher", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_now.wait(self.flush_interval)
+            self._flush_now.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"[StatusAggregator] Flush loop error: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "received_total": self._received_total,
+                "coalesced_total": self._coalesced_total,
+                "writes_total": self._writes_total,
+                "flush_failures": self._flush_failures,
+                "flush_interval_seconds": self.flush_interval,
+            }
+
+
+status_aggregator = StatusAggregator()
@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+import requests
+from app.db.app_dao import get_app_by_app_token
+from app.db.telegram_offset_dao import get_telegram_offset, set_telegram_offset
+from app.utils.app_snapshot import AppSnapshot
+
+POLL_TIMEOUT_SECONDS = 50      # long-poll duration held open by Telegram
+POLL_LIMIT = 100               # max updates per getUpdates call (Telegram's upper bound)
+ERROR_BACKOFF_SECONDS = 5
+MAX_UPDATE_ATTEMPTS = 5        # a failing update is retried this many times before it is skipped
+ALLOWED_UPDATES = ["message"]
+
+
+class TelegramPoller:
+    """
+    Long-polling ingestion for one Telegram bot.
+
+    Calls getUpdates with up to POLL_LIMIT updates per round trip and feeds each
+    update to `handler(app_token, update, bot_token=...)` - the same function the webhook
+    route uses. The next offset is persisted after every batch, so a restart
+    resumes where the previous process stopped. Useful for bursty bots and for
+    hosts without a public HTTPS endpoint.
+
+    A batch stops at the first update whose handler fails and the offset is left
+    on that update, so it is fetched again after ERROR_BACKOFF_SECONDS (the updates
+    before it are dropped as duplicates by the handler's event dedup). After
+    MAX_UPDATE_ATTEMPTS failures the update is skipped so it cannot stall the bot.
+    """
+
+    def __init__(self, app_token, handler, bot_token=None, delete_webhook=True):
+        self.app_token = app_token
+        self.handler = handler
+        self.delete_webhook = delete_webhook
+        self._stop = threading.Event()
+        self._session = requests.Session()
+
+        app = AppSnapshot.resolve(get_app_by_app_token(app_token))
+        if not app:
+            raise ValueError("Invalid app_token or app not found")
+        self.app_id = app.app_id
+        self.bot_token = bot_token or app.credentials()["telegram"]["token"]
+        if not self.bot_token:
+            raise ValueError(f"No Telegram bot token configured for app {self.app_id}")
+        self.api_url = f"https://api.telegram.org/bot{self.bot_token}"
+
+        self.offset = get_telegram_offset(self.app_id)
+        self.updates_total = 0
+        self.polls_total = 0
+        self.skipped_total = 0
+        self._failed_update_id = None
+        self._failed_attempts = 0
+
+    def _get_updates(self):
+        params = {"timeout": POLL_TIMEOUT_SECONDS, "limit": POLL_LIMIT, "allowed_updates": ALLOWED_UPDATES}
+        if self.offset is not None:
+            params["offset"] = self.offset
+        res = self._session.post(f"{self.api_url}/getUpdates", json=params, timeout=(10, POLL_TIMEOUT_SECONDS + 10))
+        res.raise_for_status()
+        data = res.json()
+        if not data.get("ok"):
+            raise RuntimeError(f"getUpdates failed: {data.get('description')}")
+        return data.get("result", [])
+
+    def poll_once(self):
+        """Fetch one batch, process it in order and persist the next offset. Returns the number processed."""
+        updates = self._get_updates()
+        self.polls_total += 1
+        if not updates:
+            return 0
+
+        processed = 0
+        error = None
+        for update in updates:
+            try:
+                self._handle(update)
+            except Exception as e:
+                if not self._give_up(update, e):
+                    error = e
+                    break
+            processed += 1
+
+        # Acknowledge only what was handled; a failed update stays at the offset and is fetched again
+        next_offset = updates[processed]["update_id"] if error else updates[-1]["update_id"] + 1
+        if next_offset != self.offset:
+            self.offset = next_offset
+            set_telegram_offset(self.app_id, self.offset)
+        self.updates_total += processed
+        logging.info(f"[TelegramPoller] app {self.app_id}: processed {processed}/{len(updates)} updates, next offset {self.offset}")
+        if error:
+            raise RuntimeError(f"update {self.offset} failed: {error}")
+        return processed
+
+    def _handle(self, update):
+        result = self.handler(self.app_token, update, bot_token=self.bot_token)
+        # The webhook handler reports some failures as a (response, status) tuple
+        if isinstance(result, tuple) and len(result) == 2 and isinstance(result[1], int) and result[1] >= 500:
+            raise RuntimeError(f"handler returned {result[1]}")
+
+    def _give_up(self, update, error):
+        """Count a failure of `update`; True once it has failed MAX_UPDATE_ATTEMPTS times and is skipped."""
+        update_id = update.get("update_id")
+        if update_id != self._failed_update_id:
+            self._failed_update_id = update_id
+            self._failed_attempts = 0
+        self._failed_attempts += 1
+        logging.exception(f"[TelegramPoller] Failed to handle update {update_id} (attempt {self._failed_attempts}): {error}")
+        if self._failed_attempts < MAX_UPDATE_ATTEMPTS:
+            return False
+        logging.error(f"[TelegramPoller] app {self.app_id}: skipping update {update_id} after {self._failed_attempts} attempts")
+        self.skipped_total += 1
+        self._failed_update_id = None
+        return True
+
+    def run(self):
+        if self.delete_webhook:
+            # getUpdates is rejected while a webhook is registered for the bot
+            try:
+                self._session.post(f"{self.api_url}/deleteWebhook", timeout=10).raise_for_status()
+            except Exception as e:
+                logging.warning(f"[TelegramPoller] Could not delete webhook for app {self.app_id}: {e}")
+
+        logging.info(f"[TelegramPoller] Polling app {self.app_id} from offset {self.offset}")
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logging.error(f"[TelegramPoller] app {self.app_id}: {e}")
+                self._stop.wait(ERROR_BACKOFF_SECONDS)
+
+    def stop(self):
+        self._stop.set()
+
+
+def run_pollers(flask_app, app_tokens, handler):
+    """Run one poller thread per app token inside the Flask app context. Blocks until interrupted."""
+    pollers = []
+    threads = []
+
+    def run_in_context(poller):
+        with flask_app.app_context():
+            poller.run()
+
+    with flask_app.app_context():
+        for app_token in app_tokens:
+            pollers.append(TelegramPoller(app_token, handler))
+
+    for poller in pollers:
+        t = threading.Thread(target=run_in_context, args=(poller,), name=f"telegram-poller-{poller.app_id}", daemon=True)
+        t.start()
+        threads.append(t)
+
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logging.info("[TelegramPoller] Stopping pollers")
+        for poller in pollers:
+            poller.stop()
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+
+# Rotation defaults; apps override them with the same names in lower case
+# (thread_rotate_max_turns, ...). 0 disables a rule.
+THREAD_ROTATE_MAX_TURNS = int(os.getenv("THREAD_ROTATE_MAX_TURNS", "100"))
+THREAD_ROTATE_MAX_PROMPT_TOKENS = int(os.getenv("THREAD_ROTATE_MAX_PROMPT_TOKENS", "32000"))
+THREAD_ROTATE_IDLE_HOURS = float(os.getenv("THREAD_ROTATE_IDLE_HOURS", "72"))
+# Optional run-level context limits (runs.create truncation_strategy / max_prompt_tokens)
+RUN_TRUNCATION_LAST_MESSAGES = int(os.getenv("RUN_TRUNCATION_LAST_MESSAGES", "0"))
+RUN_MAX_PROMPT_TOKENS = int(os.getenv("RUN_MAX_PROMPT_TOKENS", "0"))
+THREAD_SUMMARY_MODEL = os.getenv("THREAD_SUMMARY_MODEL", "gpt-4o-mini")
+THREAD_SUMMARY_MESSAGES = 30  # newest messages of the old thread fed to the summary
+METRICS_WINDOW = 1000
+
+
+def _setting(app, name, default, cast):
+    value = app.get(name) if app else None
+    return cast(value) if value is not None else default
+
+
+class ThreadPolicy:
+    """
+    When a chat moves to a fresh OpenAI thread, and how much context a run may use.
+
+    A chat rotates after `max_turns` turns on its thread, once the last run's
+    prompt reached `max_prompt_tokens`, or after `idle_hours` without activity.
+    """
+
+    __slots__ = ("max_turns", "max_prompt_tokens", "idle_hours", "truncation_last_messages", "run_max_prompt_tokens")
+
+    def __init__(self, max_turns=THREAD_ROTATE_MAX_TURNS, max_prompt_tokens=THREAD_ROTATE_MAX_PROMPT_TOKENS,
+                 idle_hours=THREAD_ROTATE_IDLE_HOURS, truncation_last_messages=RUN_TRUNCATION_LAST_MESSAGES,
+                 run_max_prompt_tokens=RUN_MAX_PROMPT_TOKENS):
+        self.max_turns = max_turns
+        self.max_prompt_tokens = max_prompt_tokens
+        self.idle_hours = idle_hours
+        self.truncation_last_messages = truncation_last_messages
+        self.run_max_prompt_tokens = run_max_prompt_tokens
+
+    @classmethod
+    def for_app(cls, app):
+        return cls(
+            max_turns=_setting(app, "thread_rotate_max_turns", THREAD_ROTATE_MAX_TURNS, int),
+            max_prompt_tokens=_setting(app, "thread_rotate_max_prompt_tokens", THREAD_ROTATE_MAX_PROMPT_TOKENS, int),
+            idle_hours=_setting(app, "thread_rotate_idle_hours", THREAD_ROTATE_IDLE_HOURS, float),
+            truncation_last_messages=_setting(app, "run_truncation_last_messages", RUN_TRUNCATION_LAST_MESSAGES, int),
+            run_max_prompt_tokens=_setting(app, "run_max_prompt_tokens", RUN_MAX_PROMPT_TOKENS, int),
+        )
+
+    @property
+    def rotation_enabled(self):
+        return bool(self.max_turns or self.max_prompt_tokens or self.idle_hours)
+
+    def rotation_reason(self, record, now=None):
+        """Return why the chat's thread should rotate ("turns", "tokens", "idle"), or None."""
+        if not record:
+            return None
+        if self.max_turns and record.get("turns", 0) >= self.max_turns:
+            return "turns"
+        if self.max_prompt_tokens and record.get("last_prompt_tokens", 0) >= self.max_prompt_tokens:
+            return "tokens"
+        last_active = record.get("last_active")
+        # An idle chat with an empty thread has nothing to forget
+        if self.idle_hours and last_active and record.get("turns", 0) and (now or time.time()) - last_active >= self.idle_hours * 3600:
+            return "idle"
+        return None
+
+    def run_options(self):
+        """Extra runs.create parameters that cap the context of a single run."""
+        options = {}
+        if self.truncation_last_messages:
+            options["truncation_strategy"] = {"type": "last_messages", "last_messages": self.truncation_last_messages}
+        if self.run_max_prompt_tokens:
+            options["max_prompt_tokens"] = self.run_max_prompt_tokens
+        return options
+
+
+class ThreadLifecycleMetrics:
+    """Rotation counters and prompt size per turn around rotations."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self.rotations_by_reason = Counter()
+        self.rotation_failures = 0
+        self._before = deque(maxlen=window)   # last prompt tokens on the old thread
+        self._after = deque(maxlen=window)    # prompt tokens of the first turn on the new thread
+        self._prompt_tokens = deque(maxlen=window)
+
+    def rotated(self, reason, record):
+        with self._lock:
+            self.rotations_by_reason[reason] += 1
+            if record.get("last_prompt_tokens"):
+                self._before.append(record["last_prompt_tokens"])
+
+    def rotation_failed(self):
+        with self._lock:
+            self.rotation_failures += 1
+
+    def turn(self, prompt_tokens, first_after_rotation=False):
+        if not prompt_tokens:
+            return
+        with self._lock:
+            self._prompt_tokens.append(prompt_tokens)
+            if first_after_rotation:
+                self._after.append(prompt_tokens)
+
+    def stats(self):
+        def avg(values):
+            return round(sum(values) / len(values)) if values else None
+
+        with self._lock:
+            return {
+                "rotations_total": sum(self.rotations_by_reason.values()),
+                "rotations_by_reason": dict(self.rotations_by_reason),
+                "rotation_failures": self.rotation_failures,
+                "prompt_tokens_per_turn_avg": avg(self._prompt_tokens),
+                "prompt_tokens_before_rotation_avg": avg(self._before),
+                "prompt_tokens_after_rotation_avg": avg(self._after),
+            }
+
+
+thread_lifecycle_metrics = ThreadLifecycleMetrics()
@@ -0,0 +1,366 @@
+import logging
+import os
+import shelve
+import sqlite3
+import threading
+import time
+from app.db.assistant_thread_dao import (
+    get_assistant_thread, create_assistant_thread, set_assistant_thread,
+    record_assistant_thread_turns, rotate_assistant_thread
+)
+from app.utils.ttl_cache import TTLCache
+
+THREAD_STORE_BACKEND = os.getenv("THREAD_STORE_BACKEND", "sqlite")  # "sqlite" or "firestore"
+THREAD_STORE_PATH = os.getenv("THREAD_STORE_PATH", "threads.db")
+THREAD_STORE_CACHE_SIZE = int(os.getenv("THREAD_STORE_CACHE_SIZE", "50000"))
+THREAD_STORE_CACHE_TTL = int(os.getenv("THREAD_STORE_CACHE_TTL", "3600"))
+THREAD_TURN_FLUSH_INTERVAL = float(os.getenv("THREAD_TURN_FLUSH_INTERVAL", "30"))   # seconds
+DEFAULT_APP_ID = "default"  # chats that are not tied to an app (legacy shelve entries)
+LOCK_STRIPES = 64
+
+
+class SQLiteThreadBackend:
+    """Single-node backend: one WAL-mode SQLite file shared by every worker process on the host."""
+
+    COLUMNS = ("thread_id", "generation", "turns", "last_prompt_tokens", "last_active", "previous_thread_id")
+
+    def __init__(self, path=THREAD_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS assistant_threads (
+                app_id TEXT NOT NULL,
+                chat_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (app_id, chat_id)
+            )
+        """)
+        # Lifecycle columns, added in place for files created before thread rotation
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(assistant_threads)")}
+        for column, definition in (
+            ("generation", "INTEGER NOT NULL DEFAULT 0"),
+            ("turns", "INTEGER NOT NULL DEFAULT 0"),
+            ("last_prompt_tokens", "INTEGER NOT NULL DEFAULT 0"),
+            ("last_active", "REAL"),
+            ("previous_thread_id", "TEXT"),
+        ):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE assistant_threads ADD COLUMN {column} {definition}")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_record(self, app_id, chat_id):
+        row = self._connect().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM assistant_threads WHERE app_id = ? AND chat_id = ?", (app_id, chat_id)
+        ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def create(self, app_id, chat_id, thread_id):
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR IGNORE INTO assistant_threads (app_id, chat_id, thread_id, updated_at, last_active) VALUES (?, ?, ?, ?, ?)",
+            (app_id, chat_id, thread_id, now, now)
+        )
+        return self.get_record(app_id, chat_id)["thread_id"]
+
+    def set(self, app_id, chat_id, thread_id):
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO assistant_threads (app_id, chat_id, thread_id, updated_at, last_active) VALUES (?, ?, ?, ?, ?)",
+            (app_id, chat_id, thread_id, now, now)
+        )
+
+    def record_turns(self, turns):
+        # Guarded by thread id: turns counted before a rotation are not added to the new thread
+        self._connect().executemany(
+            "UPDATE assistant_threads SET turns = turns + ?, last_prompt_tokens = ?, last_active = ? "
+            "WHERE app_id = ? AND chat_id = ? AND thread_id = ?",
+            [
+                (counts["turns"], counts["last_prompt_tokens"], counts["last_active"], app_id, chat_id, counts["thread_id"])
+                for (app_id, chat_id), counts in turns.items()
+            ]
+        )
+        return len(turns)
+
+    def rotate(self, app_id, chat_id, thread_id, previous_thread_id):
+        now = time.time()
+        self._connect().execute(
+            """
+            UPDATE assistant_threads
+            SET thread_id = ?, previous_thread_id = ?, generation = generation + 1,
+                turns = 0, last_prompt_tokens = 0, last_active = ?, updated_at = ?
+            WHERE app_id = ? AND chat_id = ? AND thread_id = ?
+            """,
+            (thread_id, previous_thread_id, now, now, app_id, chat_id, previous_thread_id)
+        )
+        # If another worker rotated first, the guard above matched nothing and its thread wins
+        return self.get_record(app_id, chat_id)["thread_id"]
+
+
+class FirestoreThreadBackend:
+    """Multi-node backend: one `assistant_threads` document per (app_id, chat_id)."""
+
+    def get_record(self, app_id, chat_id):
+        data = get_assistant_thread(app_id, chat_id)
+        if data is None:
+            return None
+        last_active_at = data.get("last_active_at")
+        return {
+            "thread_id": data.get("thread_id"),
+            "generation": data.get("generation", 0),
+            "turns": data.get("turns", 0),
+            "last_prompt_tokens": data.get("last_prompt_tokens", 0),
+            "last_active": last_active_at.timestamp() if last_active_at else None,
+            "previous_thread_id": data.get("previous_thread_id"),
+        }
+
+    def create(self, app_id, chat_id, thread_id):
+        return create_assistant_thread(app_id, chat_id, thread_id)
+
+    def set(self, app_id, chat_id, thread_id):
+        set_assistant_thread(app_id, chat_id, thread_id)
+
+    def record_turns(self, turns):
+        return record_assistant_thread_turns(turns)
+
+    def rotate(self, app_id, chat_id, thread_id, previous_thread_id):
+        return rotate_assistant_thread(app_id, chat_id, thread_id, previous_thread_id)
+
+
+class ThreadStore:
+    """
+    Maps (app_id, chat_id) to the chat's OpenAI thread id.
+
+    Reads go through an in-process LRU+TTL cache, so a known chat costs a dict
+    lookup. Misses hit the backend; creation is first-writer-wins in the
+    backend, so concurrent workers (or containers, with Firestore) converge
+    on a single thread per chat instead of each creating their own.
+
+    Each mapping also records its lifecycle (thread generation, turns on the
+    current thread, last prompt size, last activity) for thread rotation. The
+    cache holds the whole record; turns update it in memory and are flushed
+    to the backend every THREAD_TURN_FLUSH_INTERVAL seconds in one batch, except
+    a thread's first turn, which is written at once so every worker sees that
+    the thread has context.
+    """
+
+    def __init__(self, backend=None, cache_size=THREAD_STORE_CACHE_SIZE, cache_ttl=THREAD_STORE_CACHE_TTL,
+                 flush_interval=THREAD_TURN_FLUSH_INTERVAL):
+        self._backend = backend
+        self.cache = TTLCache("assistant_threads", maxsize=cache_size, ttl=cache_ttl)
+        self.flush_interval = flush_interval
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._init_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending_turns = {}   # key -> {"thread_id", "turns", "last_prompt_tokens", "last_active"}
+        self._pid = None
+        self.created_total = 0
+        self.races_lost = 0
+        self.turns_total = 0
+        self.turn_writes_total = 0
+        self.turn_flush_failures = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._init_lock:
+                if self._backend is None:
+                    if THREAD_STORE_BACKEND == "firestore":
+                        self._backend = FirestoreThreadBackend()
+                    else:
+                        self._backend = SQLiteThreadBackend()
+        return self._backend
+
+    def _key(self, app_id, chat_id):
+        return (app_id or DEFAULT_APP_ID, str(chat_id))
+
+    def _new_record(self, thread_id, generation=0, previous_thread_id=None):
+        return {
+            "thread_id": thread_id, "generation": generation, "turns": 0, "last_prompt_tokens": 0,
+            "last_active": time.time(), "previous_thread_id": previous_thread_id,
+        }
+
+    def _load(self, key):
+        record = self.backend.get_record(*key)
+        if record is not None:
+            with self._lock:
+                # Turns this process has counted but not flushed yet
+                pending = self._pending_turns.get(key)
+                if pending and pending["thread_id"] == record["thread_id"]:
+                    record["turns"] = (record.get("turns") or 0) + pending["turns"]
+                    record["last_prompt_tokens"] = pending["last_prompt_tokens"]
+                    record["last_active"] = pending["last_active"]
+            self.cache.set(key, record)
+        return record
+
+    def get(self, app_id, chat_id):
+        record = self.get_record(app_id, chat_id)
+        return record["thread_id"] if record else None
+
+    def get_record(self, app_id, chat_id, refresh=False):
+        """
+        The chat's mapping and lifecycle, from the cache. `refresh` re-reads the
+        backend, which also sees turns other workers have flushed.
+        """
+        key = self._key(app_id, chat_id)
+        record = None if refresh else self.cache.get(key)
+        if record is None:
+            record = self._load(key)
+        return record
+
+    def get_or_create(self, app_id, chat_id, create_thread):
+        """Return the chat's thread id, calling `create_thread()` -> thread id on first contact."""
+        thread_id = self.get(app_id, chat_id)
+        if thread_id is not None:
+            return thread_id
+
+        key = self._key(app_id, chat_id)
+        # Serialize creation per chat inside this process; the backend settles races between processes
+        with self._locks[hash(key) % LOCK_STRIPES]:
+            thread_id = self.get(*key)
+            if thread_id is not None:
+                return thread_id
+
+            new_thread_id = create_thread()
+            thread_id = self.backend.create(*key, new_thread_id)
+            self.created_total += 1
+            if thread_id != new_thread_id:
+                self.races_lost += 1
+                logging.info(f"[ThreadStore] {key} already mapped to {thread_id} by another worker; dropping {new_thread_id}")
+                self._load(key)
+            else:
+                self.cache.set(key, self._new_record(thread_id))
+            return thread_id
+
+    def set(self, app_id, chat_id, thread_id):
+        key = self._key(app_id, chat_id)
+        self.backend.set(*key, thread_id)
+        with self._lock:
+            self._pending_turns.pop(key, None)
+        self.cache.delete(key)
+
+    def record_turn(self, app_id, chat_id, prompt_tokens):
+        """Count a completed turn on the chat's current thread."""
+        key = self._key(app_id, chat_id)
+        record = self.get_record(*key)
+        if record is None:
+            return
+        now = time.time()
+        record = dict(record, turns=(record.get("turns") or 0) + 1, last_prompt_tokens=prompt_tokens or 0, last_active=now)
+        self.cache.set(key, record)
+
+        self._ensure_flusher()
+        with self._lock:
+            self.turns_total += 1
+            pending = self._pending_turns.get(key)
+            if pending is None or pending["thread_id"] != record["thread_id"]:
+                pending = self._pending_turns[key] = {"thread_id": record["thread_id"], "turns": 0}
+            pending.update(turns=pending["turns"] + 1, last_prompt_tokens=prompt_tokens or 0, last_active=now)
+        if record["turns"] == 1:
+            self.flush([key])
+
+    def flush(self, keys=None):
+        """Write the turns counted so far (all, or only those of `keys`). Returns the number of chats written."""
+        with self._flush_lock:
+            with self._lock:
+                if keys is None:
+                    turns, self._pending_turns = self._pending_turns, {}
+                else:
+                    turns = {key: self._pending_turns.pop(key) for key in keys if key in self._pending_turns}
+            if not turns:
+                return 0
+
+            try:
+                written = self.backend.record_turns(turns)
+            except Exception as e:
+                logging.warning(f"[ThreadStore] Failed to record turns for {len(turns)} chat(s): {e}")
+                with self._lock:
+                    self.turn_flush_failures += 1
+                    for key, counts in turns.items():
+                        # Merge back under turns counted meanwhile, unless the chat rotated since
+                        current = self._pending_turns.get(key)
+                        if current is None:
+                            self._pending_turns[key] = counts
+                        elif current["thread_id"] == counts["thread_id"]:
+                            current["turns"] += counts["turns"]
+                return 0
+
+            with self._lock:
+                self.turn_writes_total += written
+            return written
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork, so start one per process on first use
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pending_turns = {}
+            threading.Thread(target=self._flush_loop, name="thread-turn-flusher", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"[ThreadStore] Flush loop error: {e}")
+
+    def rotate(self, app_id, chat_id, thread_id, previous_thread_id):
+        """Point the chat at a new thread generation. Returns the thread id that won."""
+        key = self._key(app_id, chat_id)
+        previous = self.cache.get(key) or {}
+        winner = self.backend.rotate(*key, thread_id, previous_thread_id)
+        with self._lock:
+            # Turns of the old thread no longer matter for the new one
+            pending = self._pending_turns.get(key)
+            if pending and pending["thread_id"] != winner:
+                del self._pending_turns[key]
+        if winner == thread_id:
+            self.cache.set(key, self._new_record(thread_id, (previous.get("generation") or 0) + 1, previous_thread_id))
+        else:
+            self.races_lost += 1
+            logging.info(f"[ThreadStore] {key} was already rotated to {winner}; dropping {thread_id}")
+            self._load(key)
+        return winner
+
+    def import_shelve(self, path, app_id=None, overwrite=False):
+        """Copy a legacy `threads_db` shelve (wa_id -> thread id) into the store. Returns the number imported."""
+        imported = 0
+        with shelve.open(path, flag="r") as threads_shelf:
+            for chat_id, thread_id in threads_shelf.items():
+                if overwrite:
+                    self.set(app_id, chat_id, thread_id)
+                elif self.backend.create(*self._key(app_id, chat_id), thread_id) != thread_id:
+                    continue
+                imported += 1
+        return imported
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats.update({
+            "backend": THREAD_STORE_BACKEND if self._backend is None else type(self._backend).__name__,
+            "created_total": self.created_total,
+            "races_lost": self.races_lost,
+            "turns_total": self.turns_total,
+            "pending_turn_chats": len(self._pending_turns),
+            "turn_writes_total": self.turn_writes_total,
+            "turn_flush_failures": self.turn_flush_failures,
+            "turn_flush_interval_seconds": self.flush_interval,
+        })
+        return stats
+
+
+thread_store = ThreadStore()
@@ -0,0 +1,53 @@
+import threading
+from collections import Counter, deque
+
+METRICS_WINDOW = 1000
+
+
+class TurnMetrics:
+    """
+    Rolling per-turn counters for the assistant: how many OpenAI HTTP round
+    trips each turn needed and how long it took, split by run mode.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self._round_trips = deque(maxlen=window)
+        self._durations = deque(maxlen=window)
+        self.turns_by_mode = Counter()
+        self.round_trips_total = 0
+
+    def record(self, mode, round_trips, duration):
+        with self._lock:
+            self.turns_by_mode[mode] += 1
+            self.round_trips_total += round_trips
+            self._round_trips.append(round_trips)
+            self._durations.append(duration)
+
+    def stats(self):
+        with self._lock:
+            round_trips = list(self._round_trips)
+            durations = sorted(self._durations)
+            turns_total = sum(self.turns_by_mode.values())
+            turns_by_mode = dict(self.turns_by_mode)
+            round_trips_total = self.round_trips_total
+
+        def percentile(p):
+            if not durations:
+                return None
+            return round(durations[min(len(durations) - 1, int(len(durations) * p))], 3)
+
+        return {
+            "turns_total": turns_total,
+            "turns_by_mode": turns_by_mode,
+            "round_trips_total": round_trips_total,
+            "round_trips_per_turn": {
+                "avg": round(sum(round_trips) / len(round_trips), 2) if round_trips else None,
+                "max": max(round_trips) if round_trips else None,
+                "histogram": dict(sorted(Counter(round_trips).items())),
+            },
+            "duration_seconds": {"p50": percentile(0.5), "p95": percentile(0.95), "max": round(durations[-1], 3) if durations else None},
+        }
+
+
+turn_metrics = TurnMetrics()
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from app.db.usage_dao import save_usage_counters
+
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "30"))   # seconds
+UNKNOWN_APP_ID = "default"
+
+# Estimated USD per 1M (prompt, completion) tokens, matched by model-name prefix.
+# Override or extend with OPENAI_MODEL_PRICES='{"gpt-4o": [2.5, 10]}'.
+MODEL_PRICES = {
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+MODEL_PRICES.update({model: tuple(prices) for model, prices in json.loads(os.getenv("OPENAI_MODEL_PRICES", "{}")).items()})
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Return the estimated USD cost of a run, or None for models without a known price."""
+    if not model:
+        return None
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            prompt_price, completion_price = MODEL_PRICES[prefix]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return None
+
+
+class UsageMeter:
+    """
+    Meters assistant usage for billing and capacity planning.
+
+    Every turn adds its tokens, wall time, OpenAI call count and estimated
+    cost to in-memory counters per (app, day), broken down by assistant. A
+    background thread flushes them every USAGE_FLUSH_INTERVAL seconds as
+    Increment transforms in batched writes, so metering costs no Firestore
+    round trip on the reply path.
+    """
+
+    def __init__(self, flush_interval=USAGE_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters = {}   # (app_id, date) -> {"totals": {field: n}, "assistants": {assistant_id: {field: n}}}
+        self._pid = None
+
+        # metrics
+        self._recorded_total = 0
+        self._writes_total = 0
+        self._flush_failures = 0
+
+    def record(self, app_id, assistant_id, duration, api_calls, usage=None, model=None, failed=False, cached=False):
+        """Add one assistant turn. `usage` is the run's usage object (prompt/completion/total tokens)."""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        fields = {
+            "turns": 1,
+            "runs": 0 if cached else 1,
+            "failed_runs": 1 if failed else 0,
+            "answer_cache_hits": 1 if cached else 0,
+            "api_calls": api_calls,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": getattr(usage, "total_tokens", 0) or prompt_tokens + completion_tokens,
+            "run_seconds": round(duration, 3),
+        }
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        if cost:
+            fields["cost_usd"] = cost
+
+        date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        self._ensure_flusher()
+        with self._lock:
+            self._recorded_total += 1
+            self._add((app_id or UNKNOWN_APP_ID, date), assistant_id or "unknown", fields)
+
+    def _add(self, key, assistant_id, fields):
+        usage = self._counters.setdefault(key, {"totals": {}, "assistants": {}})
+        by_assistant = usage["assistants"].setdefault(assistant_id, {})
+        for field, n in fields.items():
+            if n:
+                usage["totals"][field] = usage["totals"].get(field, 0) + n
+                by_assistant[field] = by_assistant.get(field, 0) + n
+
+    def flush(self):
+        """Write the counters accumulated so far. Returns the number of documents written."""
+        with self._flush_lock:
+            with self._lock:
+                counters, self._counters = self._counters, {}
+            if not counters:
+                return 0
+
+            try:
+                written = save_usage_counters(counters)
+            except Exception as e:
+                logging.error(f"[UsageMeter] Failed to flush usage for {len(counters)} app-days: {e}")
+                # Keep the numbers for the next attempt instead of losing billable usage
+                with self._lock:
+                    self._flush_failures += 1
+                    for key, usage in counters.items():
+                        for assistant_id, fields in usage["assistants"].items():
+                            self._add(key, assistant_id, fields)
+                return 0
+
+            with self._lock:
+                self._writes_total += written
+            logging.info(f"[UsageMeter] Flushed usage for {written} app-days")
+            return written
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork, so start one per process on first use
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name="usage-flusher", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"[UsageMeter] Flush loop error: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending_app_days": len(self._counters),
+                "pending": {f"{app_id}_{date}": dict(usage["totals"]) for (app_id, date), usage in self._counters.items()},
+                "recorded_total": self._recorded_total,
+                "writes_total": self._writes_total,
+                "flush_failures": self._flush_failures,
+                "flush_interval_seconds": self.flush_interval,
+            }
+
+
+usage_meter = UsageMeter()
@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+DEFAULT_QUEUE_PATH = "webhook_queue.db"
+DEFAULT_WORKERS = 4
+MAX_ATTEMPTS = 6
+RETRY_BACKOFF_SECONDS = 5     # first retry delay, doubled per attempt: 5s, 10s, 20s, 40s, 80s
+RETRY_BACKOFF_MAX_SECONDS = 600
+DEAD_RETENTION_SECONDS = 7 * 24 * 3600   # dead events are purged after this long
+PURGE_INTERVAL_SECONDS = 3600
+LEASE_SECONDS = 300       # a claimed event older than this is considered abandoned
+IDLE_WAIT_SECONDS = 0.5   # how long an idle worker sleeps before polling again
+METRICS_WINDOW = 1000     # number of samples kept for latency/drain metrics
+
+
+class WebhookQueue:
+    """
+    Durable local work queue for inbound webhook events.
+
+    The webhook route appends the raw payload to a SQLite (WAL) table and
+    returns immediately. A bounded pool of worker threads claims events and
+    runs the handler registered for their source ("whatsapp", "telegram").
+    Several gunicorn workers can share the same file: claims are atomic and
+    stale claims are released after LEASE_SECONDS.
+
+    A failed event is retried with exponential backoff (RETRY_BACKOFF_SECONDS,
+    doubled per attempt) so a short upstream outage does not use up its
+    attempts; after MAX_ATTEMPTS it is kept as "dead" until requeued with
+    `requeue_dead()` or purged after DEAD_RETENTION_SECONDS.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, workers=DEFAULT_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.handlers = {}
+        self._flask_app = None
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._purged_at = 0.0
+
+        # metrics
+        self._enqueue_latencies = deque(maxlen=METRICS_WINDOW)
+        self._drained_at = deque(maxlen=METRICS_WINDOW)
+        self._enqueued_total = 0
+        self._processed_total = 0
+        self._failed_total = 0
+        self._dead_total = 0
+
+        self._init_db()
+
+    # ------------------------------------------------------------------
+    # storage
+    # ------------------------------------------------------------------
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS webhook_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                meta TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_at REAL,
+                created_at REAL NOT NULL
+            )
+        """)
+        # Retry columns, added in place for queue files created before backoff
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(webhook_queue)")}
+        for column in ("next_attempt_at REAL", "failed_at REAL", "last_error TEXT"):
+            if column.split()[0] not in existing:
+                conn.execute(f"ALTER TABLE webhook_queue ADD COLUMN {column}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_webhook_queue_status ON webhook_queue (status, id)")
+
+    def enqueue(self, source, payload: bytes, meta: dict = None):
+        """Durably append an event and wake a worker. Returns the queue row id."""
+        start = time.perf_counter()
+        conn = self._connect()
+        cur = conn.execute(
+            "INSERT INTO webhook_queue (source, payload, meta, created_at) VALUES (?, ?, ?, ?)",
+            (source, payload, json.dumps(meta or {}), time.time())
+        )
+        self._ensure_workers()
+        self._wakeup.set()
+
+        with self._lock:
+            self._enqueued_total += 1
+            self._enqueue_latencies.append(time.perf_counter() - start)
+        return cur.lastrowid
+
+    def _claim(self):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Release events whose worker died mid-processing
+            conn.execute(
+                "UPDATE webhook_queue SET status = 'pending' WHERE status = 'processing' AND claimed_at < ?",
+                (now - LEASE_SECONDS,)
+            )
+            row = conn.execute(
+                "SELECT id, source, payload, meta, attempts FROM webhook_queue "
+                "WHERE status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= ?) ORDER BY id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE webhook_queue SET status = 'processing', claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (now, row[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _complete(self, event_id):
+        self._connect().execute("DELETE FROM webhook_queue WHERE id = ?", (event_id,))
+
+    def _fail(self, event_id, attempts, error):
+        """Schedule the next attempt, or mark the event dead. Returns True if it is dead."""
+        now = time.time()
+        attempts += 1
+        dead = attempts >= MAX_ATTEMPTS
+        delay = min(RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1), RETRY_BACKOFF_MAX_SECONDS)
+        self._connect().execute(
+            "UPDATE webhook_queue SET status = ?, claimed_at = NULL, next_attempt_at = ?, failed_at = ?, last_error = ? WHERE id = ?",
+            ("dead" if dead else "pending", None if dead else now + delay, now, str(error)[:500], event_id)
+        )
+        return dead
+
+    def requeue_dead(self, event_ids=None):
+        """Put dead events (all, or those in `event_ids`) back in the queue with fresh attempts. Returns the count."""
+        sql = "UPDATE webhook_queue SET status = 'pending', attempts = 0, next_attempt_at = NULL WHERE status = 'dead'"
+        params = ()
+        if event_ids:
+            sql += f" AND id IN ({', '.join('?' for _ in event_ids)})"
+            params = tuple(event_ids)
+        count = self._connect().execute(sql, params).rowcount
+        if count:
+            self._wakeup.set()
+        return count
+
+    def purge_dead(self, older_than=DEAD_RETENTION_SECONDS):
+        """Delete dead events that failed more than `older_than` seconds ago. Returns the count."""
+        return self._connect().execute(
+            "DELETE FROM webhook_queue WHERE status = 'dead' AND COALESCE(failed_at, created_at) < ?", (time.time() - older_than,)
+        ).rowcount
+
+    def _maybe_purge(self):
+        now = time.time()
+        with self._lock:
+            if now - self._purged_at < PURGE_INTERVAL_SECONDS:
+                return
+            self._purged_at = now
+        try:
+            purged = self.purge_dead()
+            if purged:
+                logging.info(f"[WebhookQueue] Purged {purged} dead event(s) older than {DEAD_RETENTION_SECONDS}s")
+        except Exception as e:
+            logging.error(f"[WebhookQueue] Failed to purge dead events: {e}")
+
+    # ------------------------------------------------------------------
+    # workers
+    # ------------------------------------------------------------------
+    def register_handler(self, source, handler):
+        """handler(payload: bytes, meta: dict) is called inside the Flask app context."""
+        self.handlers[source] = handler
+
+    def start(self, flask_app):
+        self._flask_app = flask_app
+        self._ensure_workers()
+
+    def _ensure_workers(self):
+        # Threads do not survive fork, so (re)start them in every process
+        if self._flask_app is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"webhook-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            logging.info(f"[WebhookQueue] Started {self.workers} workers on {self.path}")
+
+    def _worker_loop(self):
+        while True:
+            try:
+                row = self._claim()
+            except Exception as e:
+                logging.error(f"[WebhookQueue] Failed to claim event: {e}")
+                time.sleep(IDLE_WAIT_SECONDS)
+                continue
+
+            if not row:
+                self._maybe_purge()
+                self._wakeup.wait(IDLE_WAIT_SECONDS)
+                self._wakeup.clear()
+                continue
+
+            event_id, source, payload, meta, attempts = row
+            handler = self.handlers.get(source)
+            try:
+                if not handler:
+                    raise ValueError(f"No handler registered for source '{source}'")
+                with self._flask_app.app_context():
+                    handler(payload, json.loads(meta or "{}"))
+                self._complete(event_id)
+                with self._lock:
+                    self._processed_total += 1
+                    self._drained_at.append(time.time())
+            except Exception as e:
+                logging.exception(f"[WebhookQueue] Event {event_id} ({source}) failed: {e}")
+                try:
+                    dead = self._fail(event_id, attempts, e)
+                except Exception as fail_err:
+                    # The lease expires and the event is retried then
+                    logging.error(f"[WebhookQueue] Failed to reschedule event {event_id}: {fail_err}")
+                    dead = False
+                with self._lock:
+                    self._failed_total += 1
+                    self._dead_total += dead
+
+    # ------------------------------------------------------------------
+    # metrics
+    # ------------------------------------------------------------------
+    def stats(self):
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM webhook_queue GROUP BY status").fetchall())
+        waiting_retry = conn.execute(
+            "SELECT COUNT(*) FROM webhook_queue WHERE status = 'pending' AND next_attempt_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+        with self._lock:
+            latencies = sorted(self._enqueue_latencies)
+            now = time.time()
+            drained_last_minute = sum(1 for ts in self._drained_at if now - ts <= 60)
+            enqueued_total = self._enqueued_total
+            processed_total = self._processed_total
+            failed_total = self._failed_total
+            dead_total = self._dead_total
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+        return {
+            "depth": counts.get("pending", 0),
+            "processing": counts.get("processing", 0),
+            "waiting_retry": waiting_retry,
+            "dead": counts.get("dead", 0),
+            "workers": self.workers,
+            "enqueued_total": enqueued_total,
+            "processed_total": processed_total,
+            "failed_total": failed_total,
+            "dead_total": dead_total,
+            "enqueue_latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+            "drain_rate_per_min": drained_last_minute,
+        }
+
+
+_queue = None
+
+
+def init_webhook_queue(flask_app):
+    """Create and start the queue when WEBHOOK_QUEUE_ENABLED is set. Returns None otherwise."""
+    global _queue
+    if not flask_app.config.get("WEBHOOK_QUEUE_ENABLED"):
+        return None
+
+    _queue = WebhookQueue(
+        path=flask_app.config.get("WEBHOOK_QUEUE_PATH") or DEFAULT_QUEUE_PATH,
+        workers=flask_app.config.get("WEBHOOK_QUEUE_WORKERS") or DEFAULT_WORKERS
+    )
+    _queue.start(flask_app)
+    return _queue
+
+
+def get_webhook_queue():
+    return _queue
@@ -1,3 +1,34 @@
+import time
+from app.services.outbound_limiter import outbound_limiter, RATE_LIMIT_MAX_RETRIES
+
+
 class MessageSender:
     def send_text(self, recipient_id: str, message: str) -> bool:
         raise NotImplementedError("Must be implemented by subclass.")
+
+    def rate_limits(self, recipient_id):
+        """Limits (outbound_limiter.Limit) a send to `recipient_id` has to respect."""
+        return []
+
+    def throttle(self, recipient_id, status, headers, body, attempt):
+        """(limit, seconds, scope) when the platform rate limited a send, else None."""
+        return None
+
+    def should_retry(self, recipient_id, status, headers, body, attempt):
+        """Whether a response is a rate-limit error worth retrying; pauses the throttled bucket if so."""
+        if attempt >= RATE_LIMIT_MAX_RETRIES:
+            return False
+        throttle = self.throttle(recipient_id, status, headers, body, attempt)
+        return bool(throttle) and outbound_limiter.throttled_by_platform(*throttle)
+
+    def post_limited(self, session, recipient_id, url, headers, payload):
+        """POST at the platform's allowed rate; throttled sends wait and are retried. Returns the last response."""
+        attempt = 0
+        while True:
+            wait = outbound_limiter.reserve(self.rate_limits(recipient_id))
+            if wait:
+                time.sleep(wait)
+            res = session.post(url, headers=headers, json=payload)
+            if not self.should_retry(recipient_id, res.status_code, res.headers, res.text, attempt):
+                return res
+            attempt += 1
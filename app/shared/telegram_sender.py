@@ -1,27 +1,45 @@
 from app.shared.message_sender import MessageSender
-import requests
+import os
 import logging
-from threading import Thread
-from app.services.openai_service import generate_response, run_assistant_background
+from app.services.openai_service import get_or_create_thread_id, get_tenant, run_assistant_turn
+from app.services.thread_lifecycle import ThreadPolicy
+from app.services.chat_executor import chat_executor
+from app.services.message_debouncer import message_debouncer
 from app.utils.gsc_utils import upload_to_gcs_and_get_url
+from app.utils.media_buffer import MediaBuffer
+from app.utils.http_sessions import get_session
+from app.services.outbound_limiter import telegram_limits, telegram_throttle
 from app.utils.reply_mode_utils import should_reply_to_user
 from app.db.message_dao import save_message
 
 class TelegramSender(MessageSender):
-    def __init__(self, bot_token, app_id=None, subscription=None):
+    def __init__(self, bot_token, app_id=None, subscription=None, app=None):
         self.token = bot_token
         self.api_url = f"https://api.telegram.org/bot{bot_token}"
-        self.app_id = app_id
-        self.subscription = subscription or {"tier": "free"}
+        self.bot_id = str(bot_token).split(":")[0]   # public part of the token, safe for keys and logs
+        # Request-scoped AppSnapshot; saves re-reading the app document per update
+        self.app = app
+        self.app_id = app_id or (app.app_id if app else None)
+        self.subscription = subscription or (app.subscription if app else {"tier": "free"})
 
-    def send_text(self, chat_id, message):
-        url = f"{self.api_url}/sendMessage"
+    def text_request(self, chat_id, message):
+        """(url, headers, json payload) of a text message, shared with the bulk sender."""
         payload = {
             "chat_id": chat_id,
             "text": message
         }
+        return f"{self.api_url}/sendMessage", {}, payload
+
+    def rate_limits(self, chat_id):
+        return telegram_limits(self.bot_id, chat_id)
+
+    def throttle(self, chat_id, status, headers, body, attempt):
+        return telegram_throttle(self.bot_id, chat_id, status, headers, body, attempt)
+
+    def send_text(self, chat_id, message):
+        url, headers, payload = self.text_request(chat_id, message)
         try:
-            res = requests.post(url, json=payload)
+            res = self.post_limited(get_session("telegram"), chat_id, url, headers, payload)
             res.raise_for_status()
             return True
         except Exception as e:
@@ -61,8 +79,9 @@ class TelegramSender(MessageSender):
         message_type = "text"
         image_path = None
         doc_path = None
+        doc_media = None
         
-        if not should_reply_to_user(self.app.id):
+        if not should_reply_to_user(self.app or self.app_id):
             logging.warning("ai assistant reply turn off or not within schedule")
             return None
         
@@ -85,23 +104,41 @@ class TelegramSender(MessageSender):
                 elif "document" in message:
                     content = message.get("caption", "Describe this document")
                     message_type = "document"
-                    doc_path = self.get_public_url(message.get("document")["file_id"]) #get last document file id
+                    doc_path, doc_media = self.get_public_url(message.get("document")["file_id"], keep_media=True)
                     logging.info(f"Document public url: {doc_path}")
                 
                 #generate response from assistant    
-                thread, name = generate_response(message_body=content, wa_id=str(chat_id), name=user_name, image_path=image_path, file_path=doc_path)
-            
-                Thread(target=run_assistant_background, args=(thread,name, lambda thread_id, reply: self.handle_assistant_reply(chat_id, thread_id, reply))).start()    
+                thread_id = get_or_create_thread_id(str(chat_id), user_name, get_tenant(self.app), self.app_id, ThreadPolicy.for_app(self.app))
+
+                # Bursts are coalesced into one turn; turns for the same chat are
+                # serialized while other chats run in parallel
+                # Per app: the same user id can be chatting with several tenants' bots,
+                # and each burst must reach its own app's assistant
+                chat_key = f"{self.app_id}:telegram:{chat_id}"
+                message_debouncer.submit(
+                    chat_key,
+                    {"message_body": content, "image_path": image_path, "file_path": doc_path, "file": doc_media},
+                    lambda messages: chat_executor.submit(
+                        chat_key, run_assistant_turn, messages, str(chat_id), user_name,
+                        callback=lambda thread_id, reply: self.handle_assistant_reply(chat_id, thread_id, reply),
+                        app=self.app, app_id=self.app_id,
+                        notify=lambda text: self.send_text(chat_id, text)
+                    ),
+                    window=self.app.get("message_debounce_seconds") if self.app else None
+                )
+                doc_media = None  # the queued turn owns the buffer now
                 save_message(
                     app_id=self.app_id,
                     platform="telegram",
-                    thread_id=thread.id,
+                    thread_id=thread_id,
                     chat_id=str(chat_id),
                     content=content,
                     message_type=message_type,
                     file_url=image_path if message_type == "image" else doc_path
                 )
             except Exception as e:
+                if doc_media:
+                    doc_media.close()
                 logging.info(f"Unable to process message: {e}")
                 
     
@@ -119,9 +156,13 @@ class TelegramSender(MessageSender):
 
         return command_map.get(command, f"Sorry, I don't recognize the command `{command}`.")
     
-    def get_public_url(self, file_id):
+    def get_public_url(self, file_id, keep_media=False):
+        """
+        Download a Telegram file and publish it to GCS. Returns the public URL, or
+        (public URL, MediaBuffer) with `keep_media`; the caller closes the buffer.
+        """
         # Step 1: Get file path
-        response = requests.get(f"{self.api_url}/getFile", params={"file_id": file_id})
+        response = get_session("telegram").get(f"{self.api_url}/getFile", params={"file_id": file_id})
         response.raise_for_status()
         file_path = response.json()["result"]["file_path"]
         mime_type = response.json()["result"].get("mime_type", None)
@@ -130,10 +171,16 @@ class TelegramSender(MessageSender):
         download_url = f"https://api.telegram.org/file/bot{self.token}/{file_path}"
         
         logging.info(f"Download url: {download_url}")
-        file_response = requests.get(download_url)
-        file_response.raise_for_status()
-       
-        public_url =  upload_to_gcs_and_get_url(file_bytes=file_response.content, folder_name=f"telegram-{self.token}", filename=file_path, content_type=mime_type)
+        media = MediaBuffer.download(download_url, filename=os.path.basename(file_path), content_type=mime_type)
+        try:
+            public_url = upload_to_gcs_and_get_url(file_bytes=media, folder_name=f"telegram-{self.token}", filename=file_path, content_type=mime_type)
+        except Exception:
+            media.close()
+            raise
+
+        if keep_media:
+            return public_url, media
+        media.close()
         return public_url
     
     
\ No newline at end of file
@@ -2,23 +2,31 @@ from app.shared.message_sender import MessageSender
 import requests
 import logging
 import re
-from app.services.openai_service import generate_response, run_assistant_background
+from app.services.openai_service import get_or_create_thread_id, get_tenant, run_assistant_turn
+from app.services.thread_lifecycle import ThreadPolicy
+from app.services.chat_executor import chat_executor
+from app.services.message_debouncer import message_debouncer
 from app.db.message_dao import save_message
 from app.utils.gsc_utils import upload_to_gcs_and_get_url
+from app.utils.media_buffer import MediaBuffer
+from app.utils.http_sessions import get_session
+from app.services.outbound_limiter import whatsapp_limits, whatsapp_throttle
 from app.utils.reply_mode_utils import should_reply_to_user
-from threading import Thread
 import mimetypes
 
 class WhatsAppSender(MessageSender):
-    def __init__(self, access_token, phone_number_id, version="v22.0",  app_id=None, subscription=None):
+    def __init__(self, access_token, phone_number_id, version="v22.0",  app_id=None, subscription=None, app=None):
         self.token = access_token
         self.phone_number_id = phone_number_id
         self.version = version
         self.url = f"https://graph.facebook.com/{version}/{self.phone_number_id}/messages"
-        self.app_id = app_id
-        self.subscription = subscription or {"tier": "free"}
+        # Request-scoped AppSnapshot; saves re-reading the app document per message
+        self.app = app
+        self.app_id = app_id or (app.app_id if app else None)
+        self.subscription = subscription or (app.subscription if app else {"tier": "free"})
 
-    def send_text(self, recipient_id, message):
+    def text_request(self, recipient_id, message):
+        """(url, headers, json payload) of a text message, shared with the bulk sender."""
         msg = self.process_text_for_whatsapp(message)
         headers = {
             "Authorization": f"Bearer {self.token}",
@@ -31,30 +39,52 @@ class WhatsAppSender(MessageSender):
             "type": "text",
             "text": {"preview_url": False, "body": msg},
         }
-        
+        return self.url, headers, data
+
+    def rate_limits(self, recipient_id):
+        return whatsapp_limits(self.phone_number_id, recipient_id, self._phone_rate())
+
+    def throttle(self, recipient_id, status, headers, body, attempt):
+        return whatsapp_throttle(self.phone_number_id, recipient_id, status, headers, body, attempt, self._phone_rate())
+
+    def _phone_rate(self):
+        # Messages per second allowed by the number's messaging tier
+        return self.app.get("whatsapp_messages_per_second") if self.app else None
+
+    def send_text(self, recipient_id, message):
+        url, headers, data = self.text_request(recipient_id, message)
         try:
-            res = requests.post(self.url, headers=headers, json=data)
+            res = self.post_limited(get_session("whatsapp"), recipient_id, url, headers, data)
             res.raise_for_status()
             return True
-        except requests.exceptions.HTTPError as e:
-            logging.info("Request failed:", e)
-            logging.info("Response:", res.text)
+        except requests.exceptions.RequestException as e:
+            logging.info(f"Request failed: {e}")
+            if e.response is not None:
+                logging.info(f"Response: {e.response.text}")
             return False
     
-    def handle_message(self, body):
-        wa_id = body["entry"][0]["changes"][0]["value"]["contacts"][0]["wa_id"]
-        name = body["entry"][0]["changes"][0]["value"]["contacts"][0]["profile"]["name"]
+    def handle_message(self, message, contact, batch=None, pending_turns=None):
+        """
+        Process a single inbound WhatsApp message.
+
+        `contact` is the sender entry from `value.contacts`. When `batch` is given,
+        the message record is added to that Firestore batch instead of written directly.
+        When `pending_turns` (a list) is given, the assistant turn is appended to it
+        instead of being started, so the caller can start it once the batch is committed.
+        """
+        wa_id = contact.get("wa_id") or message.get("from")
+        name = (contact.get("profile") or {}).get("name", "User")
 
-        message = body["entry"][0]["changes"][0]["value"]["messages"][0]
         msg_type = message["type"]
         
         doc_path = None
+        doc_media = None
         image_path = None
         content = ""
 
         # OpenAI Integration 
         try: 
-            if not should_reply_to_user(self.app.id):
+            if not should_reply_to_user(self.app or self.app_id):
                 logging.warning("ai assistant reply turn off or not within schedule")
                 return None
             
@@ -70,7 +100,7 @@ class WhatsAppSender(MessageSender):
             elif msg_type == "document":
                 media_id = message["document"]["id"]
                 mime_type = message["document"].get("mime_type")
-                doc_path = self.download_media_from_whatsapp(media_id, mime_type)
+                doc_path, doc_media = self.download_media_from_whatsapp(media_id, mime_type, keep_media=True)
                 content = message["document"].get("caption", "Describe this document")
                 self.send_text(wa_id, "Processing document. Please wait awhile for the reply")
             else:
@@ -78,13 +108,35 @@ class WhatsAppSender(MessageSender):
             
             #generate response from assistant
             if content:    
-                thread, name = generate_response(message_body=content, wa_id=wa_id, name=name, image_path=image_path, file_path=doc_path)
-                
-                Thread(target=run_assistant_background, args=(thread,name, lambda thread_id, reply: self.handle_assistant_reply(wa_id, thread_id, reply))).start()
+                thread_id = get_or_create_thread_id(wa_id, name, get_tenant(self.app), self.app_id, ThreadPolicy.for_app(self.app))
+
+                # Bursts are coalesced into one turn; turns for the same wa_id are
+                # serialized while other chats run in parallel
+                # Per app: the same user id can be chatting with several tenants' bots,
+                # and each burst must reach its own app's assistant
+                chat_key = f"{self.app_id}:whatsapp:{wa_id}"
+                item = {"message_body": content, "image_path": image_path, "file_path": doc_path, "file": doc_media}
+                start_turn = lambda: message_debouncer.submit(
+                    chat_key,
+                    item,
+                    lambda messages: chat_executor.submit(
+                        chat_key, run_assistant_turn, messages, wa_id, name,
+                        callback=lambda thread_id, reply: self.handle_assistant_reply(wa_id, thread_id, reply),
+                        app=self.app, app_id=self.app_id,
+                        notify=lambda text: self.send_text(wa_id, text)
+                    ),
+                    window=self.app.get("message_debounce_seconds") if self.app else None
+                )
+                if pending_turns is None:
+                    start_turn()
+                else:
+                    pending_turns.append(start_turn)
+                doc_media = None  # the queued turn owns the buffer now
                 save_message(
+                    batch=batch,
                     app_id=self.app_id,
                     platform="whatsapp",
-                    thread_id=thread.id,
+                    thread_id=thread_id,
                     chat_id=str(wa_id),
                     content=content,
                     message_type=msg_type,
@@ -92,6 +144,8 @@ class WhatsAppSender(MessageSender):
                 )
             
         except Exception as e:
+            if doc_media:
+                doc_media.close()
             logging.info(f"Failed to generate response .{e}")
             response = "unable to process message"
             self.send_text(wa_id, response)
@@ -129,7 +183,12 @@ class WhatsAppSender(MessageSender):
         return whatsapp_style_text
 
 
-    def download_media_from_whatsapp(self, media_id, mime_type):
+    def download_media_from_whatsapp(self, media_id, mime_type, keep_media=False):
+        """
+        Download a media file and publish it to GCS. Returns the public URL, or
+        (public URL, MediaBuffer) with `keep_media` so the bytes can be handed
+        to the assistant without downloading them again. The caller closes the buffer.
+        """
         ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png"}
         ALLOWED_DOC_TYPES = {
             "application/pdf",
@@ -150,17 +209,22 @@ class WhatsAppSender(MessageSender):
         if mime_type not in ALLOWED_IMAGE_TYPES and mime_type not in ALLOWED_DOC_TYPES:
             raise Exception(f"Unsupported image/document type: {mime_type}")
 
-        res = requests.get(url, headers=headers).json()
+        res = get_session("whatsapp").get(url, headers=headers).json()
         media_url = res["url"]
         
         if not media_url:
             raise Exception("No file URL returned by WhatsApp Graph API.")
 
         # Step 2: Download actual media file
-        media_resp = requests.get(media_url, headers=headers)
-        media_resp.raise_for_status()
         extension = mimetypes.guess_extension(mime_type) or ".bin"
+        media = MediaBuffer.download(media_url, filename=f"{media_id}{extension}", content_type=mime_type, headers=headers)
+        try:
+            path = upload_to_gcs_and_get_url(file_bytes=media, folder_name=f"whataspp-{self.phone_number_id}", filename=media.filename, content_type=mime_type)
+        except Exception:
+            media.close()
+            raise
 
-        path =  upload_to_gcs_and_get_url(file_bytes=media_resp.content, folder_name=f"whataspp-{self.phone_number_id}", filename=f"{media_id}{extension}", content_type=mime_type)
-
-        return path 
\ No newline at end of file
+        if keep_media:
+            return path, media
+        media.close()
+        return path
\ No newline at end of file
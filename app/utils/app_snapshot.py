@@ -0,0 +1,74 @@
+from app.db.app_dao import get_app_by_id
+
+
+class AppSnapshot:
+    """
+    Request-scoped, read-only view of an app document.
+
+    The webhook (or `with_app_context`) loads the app once and passes the
+    snapshot down to the senders, reply-mode checks and credential helpers,
+    so a single inbound message costs at most one app-document read.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data or {}
+
+    @classmethod
+    def load(cls, app_id):
+        data = get_app_by_id(app_id)
+        return cls(data) if data else None
+
+    @classmethod
+    def resolve(cls, app):
+        """Accept a snapshot, an app dict or an app_id and return a snapshot (or None)."""
+        if isinstance(app, cls):
+            return app
+        if isinstance(app, dict):
+            return cls(app)
+        if app:
+            return cls.load(app)
+        return None
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    @property
+    def app_id(self):
+        return self.data.get("app_id")
+
+    @property
+    def subscription(self):
+        return self.data.get("subscription") or {"tier": "free"}
+
+    @property
+    def waba_settings(self):
+        return self.data.get("waba_settings") or {}
+
+    @property
+    def telegram_settings(self):
+        return self.data.get("telegram_settings") or {}
+
+    @property
+    def openai_settings(self):
+        return self.data.get("openai_settings") or {}
+
+    def credentials(self):
+        """Platform credentials in the shape returned by ServiceProfileHelper.get_credentials."""
+        waba = self.waba_settings
+        telegram = self.telegram_settings
+        openai = self.openai_settings
+        return {
+            "whatsapp": {
+                "token": waba.get("waba_token") or waba.get("token"),
+                "phone_number_id": waba.get("phone_number_id")
+            },
+            "telegram": {
+                "token": telegram.get("bot_token") or telegram.get("token")
+            },
+            "openai": {
+                "api_key": openai.get("openai_api_key") or openai.get("api_key"),
+                "assistant_id": openai.get("assistant_id")
+            }
+        }
@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+
+class ClientNotConfigured(RuntimeError):
+    """Raised when a client is requested for an integration that has no configuration."""
+
+
+class ClientRegistry:
+    """
+    Creates network clients (Firestore, GCS, OpenAI, ...) lazily, once per process.
+
+    Nothing is built at import, so modules can be imported (and gunicorn can
+    `--preload` the app) without credentials or network. Clients inherited
+    through fork are discarded in the child, because gRPC channels and HTTP
+    connection pools are not fork-safe; the child builds its own on first use.
+    An integration that is not configured only fails the calls that need it.
+    """
+
+    def __init__(self):
+        self._factories = {}   # name -> (factory, probe)
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.created = Counter()
+        self.failures = Counter()
+
+    def register(self, name, factory, probe=None):
+        """
+        `factory()` builds the client (raising ClientNotConfigured when its settings
+        are missing); `probe(client)` makes one cheap call for health checks.
+        """
+        self._factories[name] = (factory, probe)
+
+    def get(self, name):
+        self._check_fork()
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(name)
+            if client is not None:
+                return client
+            factory, _ = self._factories[name]
+            start = time.monotonic()
+            try:
+                client = factory()
+            except ClientNotConfigured:
+                raise
+            except Exception as e:
+                self.failures[name] += 1
+                logging.error(f"[ClientRegistry] Failed to create {name} client: {e}")
+                raise
+            self._clients[name] = client
+            self.created[name] += 1
+            logging.info(f"[ClientRegistry] Created {name} client in pid {self._pid} ({time.monotonic() - start:.2f}s)")
+            return client
+
+    def peek(self, name):
+        """Return the client if this process has created it, without creating it."""
+        self._check_fork()
+        return self._clients.get(name)
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Drop (without closing) what the parent built; its sockets belong to the parent
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._clients = {}
+
+    def health(self, names=None):
+        """Probe each registered client. Returns {name: {"status": "ok" | "error" | "not_configured", ...}}."""
+        results = {}
+        for name in names or list(self._factories):
+            _, probe = self._factories[name]
+            start = time.monotonic()
+            try:
+                client = self.get(name)
+                if probe:
+                    probe(client)
+                results[name] = {"status": "ok"}
+            except ClientNotConfigured as e:
+                results[name] = {"status": "not_configured", "error": str(e)}
+            except Exception as e:
+                results[name] = {"status": "error", "error": str(e)}
+            results[name]["latency_ms"] = round((time.monotonic() - start) * 1000, 1)
+        return results
+
+    def stats(self):
+        self._check_fork()
+        return {
+            "pid": self._pid,
+            "clients": {
+                name: {
+                    "initialized": name in self._clients,
+                    "created": self.created[name],
+                    "failures": self.failures[name],
+                }
+                for name in self._factories
+            },
+        }
+
+
+client_registry = ClientRegistry()
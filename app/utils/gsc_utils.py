@@ -1,20 +1,44 @@
 import uuid
 from google.cloud import storage
 from google.api_core.exceptions import NotFound, Forbidden, GoogleAPICallError, ServiceUnavailable
+from google.auth.exceptions import DefaultCredentialsError
 import logging
 from urllib.parse import urlparse
+from app.utils.client_registry import client_registry, ClientNotConfigured
 
 BUCKET_NAME = "chatagent-cs"
 
+
+def _create_client():
+    try:
+        return storage.Client()
+    except DefaultCredentialsError as e:
+        raise ClientNotConfigured(f"No Google Cloud credentials for GCS: {e}")
+
+
+client_registry.register(
+    "gcs", _create_client,
+    probe=lambda client: list(client.list_blobs(BUCKET_NAME, max_results=1, timeout=10))
+)
+
+
+def get_storage_client():
+    return client_registry.get("gcs")
+
+
 def upload_to_gcs_and_get_url(file_bytes, bucket_name="chatagent-cs", folder_name="media", filename="file", content_type="application/octet-stream"):
     try:
-        client = storage.Client()
+        client = get_storage_client()
         bucket = client.bucket(bucket_name)
 
         blob_name = f"{folder_name}/{uuid.uuid4()}_{filename}"
         blob = bucket.blob(blob_name)
 
-        blob.upload_from_string(file_bytes, content_type=content_type)
+        if hasattr(file_bytes, "open"):
+            # MediaBuffer: stream from the buffer instead of copying it into a bytes object
+            blob.upload_from_file(file_bytes.open(), rewind=True, size=file_bytes.size, content_type=content_type)
+        else:
+            blob.upload_from_string(file_bytes, content_type=content_type)
         blob.make_public()  # Optional: if you want to avoid signed URLs
 
         return blob.public_url
@@ -47,7 +71,7 @@ def delete_from_gcs(public_url):
         parsed_url = urlparse(public_url)
         blob_path = parsed_url.path.lstrip("/")  # Remove leading slash
 
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         bucket = storage_client.bucket(BUCKET_NAME)
         blob = bucket.blob(blob_path)
 
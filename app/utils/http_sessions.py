@@ -0,0 +1,110 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.utils.client_registry import client_registry
+
+# Connections kept alive per host; sized for the chat executor so concurrent replies do not reconnect
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", os.getenv("CHAT_EXECUTOR_WORKERS", "32")))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# One session per upstream: "whatsapp" (Graph API), "telegram" (Bot API), "media" (file downloads)
+SESSION_NAMES = ("whatsapp", "telegram", "media")
+
+
+class _TimeoutAdapter(HTTPAdapter):
+    # requests has no session-wide timeout; apply ours when the caller gives none
+    def __init__(self, timeout, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+class _SessionMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.server_errors = 0
+        self.elapsed_total = 0.0
+
+    def on_response(self, response, *args, **kwargs):
+        with self._lock:
+            self.responses += 1
+            if response.status_code >= 500:
+                self.server_errors += 1
+            self.elapsed_total += response.elapsed.total_seconds()
+
+
+def _create_session(name):
+    # Connection failures are retried for every method (nothing was sent); 5xx only
+    # for idempotent ones, so a message POST is never delivered twice
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=HTTP_MAX_RETRIES,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False
+    )
+    adapter = _TimeoutAdapter(
+        (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+        pool_connections=4,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.metrics = _SessionMetrics()
+    session.hooks["response"].append(session.metrics.on_response)
+    return session
+
+
+for _name in SESSION_NAMES:
+    client_registry.register(f"http_{_name}", lambda name=_name: _create_session(name))
+
+
+def get_session(name):
+    """Pooled keep-alive session for an upstream in SESSION_NAMES, created once per process."""
+    return client_registry.get(f"http_{name}")
+
+
+def http_pool_stats():
+    """Connection reuse per session and host for the sessions this process has used."""
+    stats = {}
+    for name in SESSION_NAMES:
+        session = client_registry.peek(f"http_{name}")
+        if session is None:
+            continue
+        metrics = session.metrics
+        hosts = {}
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                hosts[pool.host] = {
+                    "connections_opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "idle_connections": pool.pool.qsize() if pool.pool else 0,
+                    "reuse_rate": round(1 - pool.num_connections / pool.num_requests, 4) if pool.num_requests else None,
+                }
+        with metrics._lock:
+            stats[name] = {
+                "responses": metrics.responses,
+                "server_errors": metrics.server_errors,
+                "avg_response_ms": round(metrics.elapsed_total / metrics.responses * 1000, 1) if metrics.responses else None,
+                "pool_maxsize": HTTP_POOL_MAXSIZE,
+                "hosts": hosts,
+            }
+    return stats
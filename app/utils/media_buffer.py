@@ -0,0 +1,76 @@
+import hashlib
+import os
+import tempfile
+from app.utils.http_sessions import get_session, HTTP_CONNECT_TIMEOUT
+
+MEDIA_SPOOL_MAX_BYTES = int(os.getenv("MEDIA_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = (HTTP_CONNECT_TIMEOUT, 60)
+
+
+class MediaBuffer:
+    """
+    Bytes of one downloaded media file, carried through the pipeline so they
+    are fetched once and re-used for every upload (GCS, OpenAI).
+
+    Small files stay in memory; past `max_size` bytes the buffer rolls over to
+    an anonymous temp file that is private to this buffer and removed on close.
+    """
+
+    def __init__(self, filename, content_type=None, max_size=MEDIA_SPOOL_MAX_BYTES):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size)
+
+    @classmethod
+    def download(cls, url, filename, content_type=None, headers=None, timeout=DOWNLOAD_TIMEOUT):
+        """Stream `url` into a new buffer without holding more than one chunk outside it."""
+        media = cls(filename, content_type)
+        try:
+            with get_session("media").get(url, headers=headers, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                media.content_type = content_type or response.headers.get("Content-Type")
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    media.write(chunk)
+        except Exception:
+            media.close()
+            raise
+        return media
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    @property
+    def sha256(self):
+        """Hex digest of the bytes written so far, computed while downloading."""
+        return self._hash.hexdigest()
+
+    def open(self):
+        """Return the underlying file object rewound to the start."""
+        self._file.seek(0)
+        return self._file
+
+    def as_upload(self):
+        """(filename, file, content_type) tuple accepted by the OpenAI SDK's file parameters."""
+        return (self.filename, self.open(), self.content_type or "application/octet-stream")
+
+    @property
+    def spilled(self):
+        return bool(getattr(self._file, "_rolled", False))
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,6 +1,7 @@
 import logging
 import json
 from app.db.message_dao import update_message_by_thread
+from app.utils.webhook_envelope import WebhookEnvelope
 
 def log_http_response(response):
     logging.info(f"Status: {response.status_code}")
@@ -21,16 +22,13 @@ def get_text_message_input(recipient, text):
     
 def is_valid_whatsapp_message(body):
     """
-    Check if the incoming webhook event has a valid WhatsApp message structure.
+    Check if the incoming webhook event has a valid WhatsApp message structure,
+    i.e. at least one entry/change carries a message.
+
+    Accepts a decoded body or an already walked WebhookEnvelope.
     """
-    return (
-        body.get("object")
-        and body.get("entry")
-        and body["entry"][0].get("changes")
-        and body["entry"][0]["changes"][0].get("value")
-        and body["entry"][0]["changes"][0]["value"].get("messages")
-        and body["entry"][0]["changes"][0]["value"]["messages"][0]
-    )
+    envelope = body if isinstance(body, WebhookEnvelope) else WebhookEnvelope(body)
+    return envelope.is_message_event
 
 
 def save_assistant_reply(thread_id: str, reply: str) -> None:
@@ -1,17 +1,29 @@
 import logging
 from datetime import datetime
-from app.db.app_dao import get_app_by_id
+from app.utils.app_snapshot import AppSnapshot
+from app.db.app_dao import get_app_reply_settings
 
-def should_reply_to_user(app_id):
-    app_data = get_app_by_id(app_id)
-    mode = app_data.get("ai_reply_mode", "auto")
+def should_reply_to_user(app):
+    """
+    `app` is the AppSnapshot loaded for this request; an app_id is still
+    accepted but costs an extra Firestore read. The reply mode itself is read
+    through get_app_reply_settings, not from the (longer cached) snapshot, so
+    switching it off stops auto-replies within REPLY_MODE_CACHE_TTL seconds.
+    """
+    app_data = AppSnapshot.resolve(app)
+    if not app_data:
+        logging.warning(f"[AI Reply] App {app} not found. Skipping reply.")
+        return False
+    app_id = app_data.app_id
+    reply_settings = get_app_reply_settings(app_id) if app_id else app_data
+    mode = reply_settings.get("ai_reply_mode") or "auto"
 
     if mode == "off":
         logging.info(f"[AI Reply] Mode is OFF for app {app_id}. Skipping reply.")
         return False
 
     if mode == "scheduled":
-        schedule = app_data.get("scheduled_schedule", {})
+        schedule = reply_settings.get("scheduled_schedule") or {}
         now = datetime.now()
         day = now.strftime('%a').lower()[:3]  # 'mon', 'tue', etc.
         today_schedule = schedule.get(day)
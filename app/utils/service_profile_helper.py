@@ -1,26 +1,13 @@
-from app.db.app_dao import get_app_by_id
+from app.utils.app_snapshot import AppSnapshot
 
 class ServiceProfileHelper:
     @staticmethod
-    def get_credentials(app_id):
-        app = get_app_by_id(app_id)
-        if not app:
+    def get_credentials(app):
+        """
+        `app` may be an AppSnapshot already loaded for this request, an app dict,
+        or an app_id (which costs one Firestore read).
+        """
+        snapshot = AppSnapshot.resolve(app)
+        if not snapshot:
             raise ValueError("App not found")
-
-        waba = app.get("waba_settings", {})
-        telegram = app.get("telegram_settings", {})
-        openai = app.get("openai_settings", {})
-
-        return {
-            "whatsapp": {
-                "token": waba.get("token"),
-                "phone_number_id": waba.get("phone_number_id")
-            },
-            "telegram": {
-                "token": telegram.get("token")
-            },
-            "openai": {
-                "api_key": openai.get("api_key"),
-                "assistant_id": openai.get("assistant_id")
-            }
-        }
+        return snapshot.credentials()
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+_registry = {}
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache with per-entry expiry.
+
+    get/set/delete are O(1). Named caches are registered (unless register=False) so their
+    hit/miss counters can be reported through `cache_stats()`.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=300, register=True):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if register:
+            _registry[name] = self
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING or item[0] < now:
+                if item is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def add(self, key, value=True, ttl=None):
+        """Insert only if the key is absent (or expired). Returns True if inserted."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] >= now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return False
+            self.misses += 1
+            self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def cache_stats():
+    """Stats of every named cache in this process."""
+    return {name: cache.stats() for name, cache in _registry.items()}
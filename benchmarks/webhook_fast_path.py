@@ -0,0 +1,93 @@
+"""
+Microbenchmark: per-request CPU of the WhatsApp webhook ingress path.
+
+Compares the previous path (decode body to str, re-encode for HMAC with a
+freshly keyed digest, stdlib json decode, repeated nested indexing) with the
+fast path (HMAC over raw bytes with a pre-keyed digest, one orjson decode into
+a WebhookEnvelope shared by validator and handler).
+
+Run from the repository root:
+    python benchmarks/webhook_fast_path.py
+"""
+import hashlib
+import hmac
+import importlib.util
+import json
+import os
+import timeit
+
+# Load the envelope module directly so the benchmark doesn't boot the Flask app
+_spec = importlib.util.spec_from_file_location(
+    "webhook_envelope", os.path.join(os.path.dirname(__file__), "..", "app", "utils", "webhook_envelope.py")
+)
+webhook_envelope = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(webhook_envelope)
+
+APP_SECRET = "0123456789abcdef0123456789abcdef"
+ITERATIONS = 20000
+
+
+def build_payload(messages=3, statuses=6):
+    value = {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "15550000000", "phone_number_id": "123456789"},
+        "contacts": [{"profile": {"name": f"User {i}"}, "wa_id": f"3161234567{i}"} for i in range(messages)],
+        "messages": [
+            {"from": f"3161234567{i}", "id": f"wamid.in.{i}", "timestamp": "1700000000", "type": "text",
+             "text": {"body": "Hello, what time is check-in tomorrow? " * 4}}
+            for i in range(messages)
+        ],
+        "statuses": [
+            {"id": f"wamid.out.{i}", "status": "delivered", "timestamp": "1700000000", "recipient_id": "31612345670"}
+            for i in range(statuses)
+        ],
+    }
+    body = {"object": "whatsapp_business_account", "entry": [{"id": "WABA", "changes": [{"field": "messages", "value": value}]}]}
+    return json.dumps(body).encode("utf-8")
+
+
+RAW = build_payload()
+SIGNATURE = hmac.new(APP_SECRET.encode("latin-1"), RAW, hashlib.sha256).hexdigest()
+_PREKEYED = hmac.new(APP_SECRET.encode("latin-1"), digestmod=hashlib.sha256)
+
+
+def old_path():
+    # signature_required
+    payload = RAW.decode("utf-8")
+    expected = hmac.new(bytes(APP_SECRET, "latin-1"), msg=payload.encode("utf-8"), digestmod=hashlib.sha256).hexdigest()
+    assert hmac.compare_digest(expected, SIGNATURE)
+    # handle_message: request.get_json() + status check + validator + handler indexing
+    body = json.loads(RAW)
+    body.get("entry", [{}])[0].get("changes", [{}])[0].get("value", {}).get("statuses")
+    assert (
+        body.get("object")
+        and body.get("entry")
+        and body["entry"][0].get("changes")
+        and body["entry"][0]["changes"][0].get("value")
+        and body["entry"][0]["changes"][0]["value"].get("messages")
+        and body["entry"][0]["changes"][0]["value"]["messages"][0]
+    )
+    body["entry"][0]["changes"][0]["value"]["metadata"]["phone_number_id"]
+    body["entry"][0]["changes"][0]["value"]["contacts"][0]["wa_id"]
+    body["entry"][0]["changes"][0]["value"]["contacts"][0]["profile"]["name"]
+    body["entry"][0]["changes"][0]["value"]["messages"][0]["type"]
+
+
+def fast_path():
+    mac = _PREKEYED.copy()
+    mac.update(RAW)
+    assert hmac.compare_digest(mac.hexdigest(), SIGNATURE)
+    envelope = webhook_envelope.WebhookEnvelope.from_bytes(RAW)
+    assert envelope.is_message_event
+    for contact, message in envelope.messages_by_phone["123456789"]:
+        message["type"]
+
+
+if __name__ == "__main__":
+    decoder = "orjson" if webhook_envelope.orjson else "json (install orjson for the full gain)"
+    old = min(timeit.repeat(old_path, number=ITERATIONS, repeat=5)) / ITERATIONS * 1e6
+    new = min(timeit.repeat(fast_path, number=ITERATIONS, repeat=5)) / ITERATIONS * 1e6
+    print(f"payload: {len(RAW)} bytes, decoder: {decoder}")
+    print(f"old path : {old:.2f} us/request")
+    print(f"fast path: {new:.2f} us/request")
+    print(f"saved    : {old - new:.2f} us/request ({(1 - new / old) * 100:.0f}%)")
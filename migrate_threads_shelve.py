@@ -0,0 +1,25 @@
+import argparse
+import logging
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.services.thread_store import THREAD_STORE_BACKEND, thread_store
+
+# One-off import of legacy shelve thread mappings (wa_id -> OpenAI thread id)
+# into the configured thread store (THREAD_STORE_BACKEND).
+# Usage: python migrate_threads_shelve.py threads_db --app-id <app_id> [--overwrite]
+# The senders look chats up by their app id, so mappings must be imported under the app that owns them.
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Import a threads_db shelve file into the thread store")
+    parser.add_argument("path", nargs="+", help="shelve file name(s), without the .db/.dat suffix")
+    parser.add_argument("--app-id", required=True, help="app the chats belong to (the app_id the senders look them up by)")
+    parser.add_argument("--overwrite", action="store_true", help="replace mappings that already exist in the store")
+    args = parser.parse_args()
+
+    for path in args.path:
+        imported = thread_store.import_shelve(path, app_id=args.app_id, overwrite=args.overwrite)
+        logging.info(f"Imported {imported} thread(s) from {path} into the {THREAD_STORE_BACKEND} thread store")
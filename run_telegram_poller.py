@@ -0,0 +1,21 @@
+import logging
+import os
+import sys
+
+from app import create_app
+from app.routes.webhook_routes import handle_telegram_update
+from app.services.telegram_poller import run_pollers
+
+# Long-polling alternative to /telegram/webhook for hosts without a public HTTPS endpoint.
+# Usage: python run_telegram_poller.py <app_token> [<app_token> ...]
+#    or: TELEGRAM_POLL_APP_TOKENS="token1,token2" python run_telegram_poller.py
+
+app = create_app()
+
+if __name__ == "__main__":
+    app_tokens = sys.argv[1:] or [t.strip() for t in os.getenv("TELEGRAM_POLL_APP_TOKENS", "").split(",") if t.strip()]
+    if not app_tokens:
+        sys.exit("No app tokens given. Pass them as arguments or set TELEGRAM_POLL_APP_TOKENS.")
+
+    logging.info(f"Telegram poller started for {len(app_tokens)} app(s)")
+    run_pollers(app, app_tokens, handle_telegram_update)